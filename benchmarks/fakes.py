@@ -0,0 +1,440 @@
+"""Local stand-ins for the arXiv, Notion and OpenAI HTTP APIs.
+
+Each fake sits at the transport layer, so the real clients (`requests`,
+`notion_client`, `openai`), the instrumentation hooks and the response
+parsing all run exactly as they do against the live services. Everything
+is deterministic for a given seed.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from xml.sax.saxutils import escape
+
+import httpx
+import numpy as np
+import requests
+
+WORDS = (
+    "efficient sparse quantized low-rank transformer attention diffusion "
+    "language vision graph neural network model models training inference "
+    "pruning distillation accelerator hardware memory bandwidth kernel "
+    "scheduling serving latency throughput robust adversarial safety "
+    "alignment reinforcement learning policy reward benchmark dataset "
+    "federated privacy compression mixture experts routing token cache "
+    "speculative decoding retrieval augmented reasoning agent planning "
+    "convolutional recurrent state space scaling laws emergent optimization "
+    "gradient stochastic convergence theory generalization calibration"
+).split()
+CATEGORIES = ("cs.LG", "cs.AI", "cs.AR", "cs.CL", "cs.CV")
+
+
+def _sentence(rng, n):
+    return " ".join(rng.choices(WORDS, k=n)).capitalize() + "."
+
+
+class FakeArxiv(requests.adapters.BaseAdapter):
+    """The arXiv export API over a synthetic corpus of `n_papers` entries.
+
+    Papers are spread evenly over the last `days` days, newest first, and
+    generated on demand from their index, so a 100k corpus costs nothing
+    until it is paged through. Mount it on a `requests.Session`.
+    """
+
+    def __init__(self, n_papers, days=7, latency=0.0, seed=0):
+        super().__init__()
+        self.n_papers = n_papers
+        self.latency = latency
+        self.seed = seed
+        self.newest = datetime.now(timezone.utc).replace(tzinfo=None)
+        self.newest -= timedelta(minutes=1)
+        self.step = timedelta(days=days) / max(n_papers, 1)
+        rng = random.Random(seed)
+        # abstracts are stitched from a fixed pool of sentences
+        self.sentences = [_sentence(rng, rng.randint(10, 25)) for _ in range(512)]
+        # each paper is cross-listed in 1 to 3 categories, as a bitmask
+        masks = np.random.default_rng(seed).random((n_papers, len(CATEGORIES)))
+        masks = masks < 1.5 / len(CATEGORIES)
+        masks[np.arange(n_papers), np.arange(n_papers) % len(CATEGORIES)] = True
+        self.categories = masks @ (1 << np.arange(len(CATEGORIES)))
+        self.requests = Counter()
+
+    def arxiv_id(self, i):
+        return f"{2601 + i // 100_000}.{i % 100_000:05d}"
+
+    def index(self, arxiv_id):
+        m = re.match(r"^(\d{4})\.(\d{5})$", arxiv_id)
+        i = (int(m.group(1)) - 2601) * 100_000 + int(m.group(2)) if m else -1
+        return i if 0 <= i < self.n_papers else None
+
+    def paper(self, i):
+        rng = random.Random(self.seed * 1_000_003 + i)
+        published = self.newest - i * self.step
+        return {
+            "id": f"http://arxiv.org/abs/{self.arxiv_id(i)}v1",
+            "published": published.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "title": " ".join(rng.choices(WORDS, k=rng.randint(5, 10))).title(),
+            "summary": " ".join(rng.choices(self.sentences, k=rng.randint(6, 10))),
+            "authors": [
+                f"Author {rng.randrange(5000)}" for _ in range(rng.randint(1, 6))
+            ],
+            "categories": [
+                c for b, c in enumerate(CATEGORIES) if self.categories[i] >> b & 1
+            ],
+        }
+
+    def _index_range(self, start, end):
+        # indices whose published time falls inside [start, end]
+        step = self.step.total_seconds()
+        first = max(0, -int(-(self.newest - end).total_seconds() // step))
+        last = min(
+            self.n_papers, int((self.newest - start).total_seconds() // step) + 1
+        )
+        return first, max(first, last)
+
+    def _entry(self, paper):
+        authors = "".join(
+            f"<author><name>{escape(a)}</name></author>" for a in paper["authors"]
+        )
+        categories = "".join(
+            f'<category term="{c}" scheme="http://arxiv.org/schemas/atom"/>'
+            for c in paper["categories"]
+        )
+        return (
+            f"<entry><id>{paper['id']}</id>"
+            f"<updated>{paper['published']}</updated>"
+            f"<published>{paper['published']}</published>"
+            f"<title>{escape(paper['title'])}</title>"
+            f"<summary>{escape(paper['summary'])}</summary>{authors}"
+            f'<link href="{paper["id"]}" rel="alternate" type="text/html"/>'
+            f'<arxiv:primary_category term="{paper["categories"][0]}"/>'
+            f"{categories}</entry>"
+        )
+
+    def feed(self, url):
+        params = dict(re.findall(r"[?&](\w+)=([^&]*)", url))
+        offset = int(params.get("start", 0))
+        limit = int(params.get("max_results", 10))
+        if "id_list" in params:
+            ids = requests.utils.unquote(params["id_list"]).split(",")
+            matches = [i for i in map(self.index, ids) if i is not None]
+        elif "submittedDate" in url:
+            start, end = (
+                datetime.strptime(d, "%Y%m%d%H%M")
+                for d in re.findall(r"\d{12}", url)[:2]
+            )
+            first, last = self._index_range(start, end)
+            wanted = sum(
+                1 << CATEGORIES.index(c)
+                for c in re.findall(r"cat:([\w.-]+)", url)
+                if c in CATEGORIES
+            )
+            matches = range(first, last)
+            if wanted:
+                hits = self.categories[first:last] & wanted
+                matches = (np.flatnonzero(hits) + first).tolist()
+        else:
+            # title searches never match the synthetic corpus
+            matches = []
+        page = matches[offset : offset + limit]
+        entries = "".join(self._entry(self.paper(i)) for i in page)
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<feed xmlns="http://www.w3.org/2005/Atom" '
+            'xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/" '
+            'xmlns:arxiv="http://arxiv.org/schemas/atom">'
+            "<title>ArXiv Query</title>"
+            f"<opensearch:totalResults>{len(matches)}</opensearch:totalResults>"
+            f"<opensearch:startIndex>{offset}</opensearch:startIndex>"
+            f"<opensearch:itemsPerPage>{limit}</opensearch:itemsPerPage>"
+            f"{entries}</feed>"
+        )
+
+    def send(self, request, **kwargs):
+        self.requests["query"] += 1
+        time.sleep(self.latency)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = self.feed(request.url).encode()
+        response.headers["Content-Type"] = "application/atom+xml; charset=utf-8"
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class FakeNotion:
+    """In-memory Notion databases served through an `httpx.MockTransport`.
+
+    Every request sleeps `latency` seconds and takes a token from a bucket
+    refilled at `rate` per second holding at most `burst`; an empty bucket
+    answers 429 with a Retry-After header, like the real API. The bucket is
+    shared by every database, as it is per integration on the real API.
+    """
+
+    def __init__(self, database_id, latency=0.1, rate=3.0, burst=10, seed=0):
+        self.database_id = database_id
+        self.latency = latency
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.pages = {}
+        self.requests = Counter()
+        self.throttled = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._clock = datetime(2025, 1, 1)
+
+    def seed_library(self, n_pages, rated_fraction=0.2, database_id=None):
+        rng = self._rng
+        for i in range(n_pages):
+            rating = None
+            if rng.random() < rated_fraction:
+                rating = str(rng.choice((1, 2, 4, 4, 5, 5)))
+            self._create(
+                {
+                    "Name": {
+                        "title": [
+                            {
+                                "text": {
+                                    "content": " ".join(
+                                        rng.choices(WORDS, k=rng.randint(5, 10))
+                                    ).title()
+                                }
+                            }
+                        ]
+                    },
+                    "URL": {"url": f"https://arxiv.org/abs/2501.{i:05d}"},
+                    "Abstract": {
+                        "rich_text": [{"text": {"content": _sentence(rng, 120)}}]
+                    },
+                },
+                rating=rating,
+                database_id=database_id,
+            )
+
+    def client(self, **kwargs):
+        return httpx.Client(transport=httpx.MockTransport(self.handle), **kwargs)
+
+    # --- state ---
+    def _tick(self):
+        self._clock += timedelta(minutes=1)
+        return self._clock.strftime("%Y-%m-%dT%H:%M:00.000Z")
+
+    def _create(self, properties, rating=None, database_id=None):
+        edited = self._tick()
+        page = {
+            "object": "page",
+            "id": str(uuid.UUID(int=self._rng.getrandbits(128))),
+            "created_time": edited,
+            "last_edited_time": edited,
+            "archived": False,
+            "in_trash": False,
+            "parent": {
+                "type": "database_id",
+                "database_id": database_id or self.database_id,
+            },
+            "properties": {
+                "Name": {"title": []},
+                "URL": {"url": None},
+                "Abstract": {"rich_text": []},
+                "Rating": {"multi_select": [{"name": rating}] if rating else []},
+                **properties,
+            },
+        }
+        self.pages[page["id"]] = page
+        return page
+
+    def _matches(self, page, query_filter):
+        if not query_filter:
+            return True
+        if "last_edited_time" in query_filter:
+            return (
+                page["last_edited_time"]
+                >= query_filter["last_edited_time"]["on_or_after"]
+            )
+        if query_filter.get("property") == "Rating":
+            return bool(page["properties"]["Rating"]["multi_select"])
+        return True
+
+    def _query(self, database_id, body):
+        pages = [
+            p
+            for p in self.pages.values()
+            if p["parent"]["database_id"] == database_id
+            and self._matches(p, body.get("filter"))
+        ]
+        pages.sort(key=lambda p: p["last_edited_time"], reverse=True)
+        size = min(body.get("page_size", 100), 100)
+        offset = int(body.get("start_cursor") or 0)
+        more = offset + size < len(pages)
+        return {
+            "object": "list",
+            "results": pages[offset : offset + size],
+            "next_cursor": str(offset + size) if more else None,
+            "has_more": more,
+        }
+
+    def _allow(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    # --- transport ---
+    def handle(self, request):
+        time.sleep(self.latency)
+        path = request.url.path.removeprefix("/v1/")
+        body = json.loads(request.content) if request.content else {}
+        with self._lock:
+            if not self._allow():
+                self.throttled += 1
+                return httpx.Response(
+                    429,
+                    headers={"Retry-After": "1"},
+                    json={
+                        "object": "error",
+                        "status": 429,
+                        "code": "rate_limited",
+                        "message": "Rate limited",
+                    },
+                )
+            if request.method == "POST" and path.endswith("/query"):
+                self.requests["query"] += 1
+                database_id = path.split("/")[1]
+                return httpx.Response(200, json=self._query(database_id, body))
+            if request.method == "POST" and path == "pages":
+                self.requests["create"] += 1
+                page = self._create(
+                    body["properties"], database_id=body["parent"]["database_id"]
+                )
+                return httpx.Response(200, json=page)
+            if request.method == "PATCH" and path.startswith("pages/"):
+                self.requests["update"] += 1
+                page = self.pages[path.split("/")[1]]
+                page["properties"].update(body.get("properties", {}))
+                page["last_edited_time"] = self._tick()
+                return httpx.Response(200, json=page)
+        return httpx.Response(
+            404,
+            json={
+                "object": "error",
+                "status": 404,
+                "code": "object_not_found",
+                "message": path,
+            },
+        )
+
+
+class FakeOpenAI:
+    """Deterministic Responses API behind an `httpx.MockTransport`.
+
+    Ranking requests score every `[arxiv_id]` line by a hash of its id,
+    digest requests echo the titles, and free-text requests get a fixed
+    profile. Each call sleeps `latency` seconds plus the output tokens over
+    `tokens_per_second`, and reports token usage at ~4 characters a token.
+    """
+
+    PROFILE = (
+        "(1) The user works on efficient machine learning: quantization, "
+        "pruning, compression, ML systems and hardware accelerators, plus AI "
+        "safety. (2) Tags: quantization, pruning, sparsity, efficient "
+        "inference, serving, accelerators, red-teaming."
+    )
+
+    def __init__(self, latency=0.3, tokens_per_second=500):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.requests = Counter()
+        self._lock = threading.Lock()
+
+    def client(self, **kwargs):
+        return httpx.Client(transport=httpx.MockTransport(self.handle), **kwargs)
+
+    def _rank(self, system, user):
+        limit = int(re.search(r"at most (\d+)", system).group(1))
+        ids = re.findall(r"^\[([^\]]+)\]", user, re.M)
+        scored = sorted(ids, key=lambda i: zlib.crc32(i.encode()))[:limit]
+        return {
+            "papers": [
+                {
+                    "arxiv_id": i,
+                    "score": 1 + zlib.crc32(i.encode()) % 10,
+                    "rationale": "Matches the stated research interests.",
+                }
+                for i in scored
+            ]
+        }
+
+    def _digest(self, user):
+        return {
+            "digests": [
+                {"page_id": page_id, "digest": f"{name}. Keywords: {name.lower()}"}
+                for page_id, name in re.findall(r"^\[([^\]]+)\] ([^:]*):", user, re.M)
+            ]
+        }
+
+    def handle(self, request):
+        body = json.loads(request.content)
+        messages = body["input"]
+        if isinstance(messages, str):
+            messages = [{"role": "user", "content": messages}]
+        text = {m["role"]: m["content"] for m in messages}
+        fmt = body.get("text", {}).get("format", {}).get("name")
+        if fmt == "RankedPapers":
+            output = json.dumps(self._rank(text.get("system", ""), text["user"]))
+        elif fmt == "PaperDigests":
+            output = json.dumps(self._digest(text["user"]))
+        else:
+            output = self.PROFILE
+        with self._lock:
+            self.requests[fmt or "text"] += 1
+
+        usage = {
+            "input_tokens": sum(len(m["content"]) for m in messages) // 4,
+            "output_tokens": len(output) // 4,
+        }
+        time.sleep(self.latency + usage["output_tokens"] / self.tokens_per_second)
+        return httpx.Response(
+            200,
+            json={
+                "id": f"resp_{uuid.uuid4().hex}",
+                "object": "response",
+                "created_at": int(time.time()),
+                "model": body["model"],
+                "status": "completed",
+                "output": [
+                    {
+                        "type": "message",
+                        "id": f"msg_{uuid.uuid4().hex}",
+                        "role": "assistant",
+                        "status": "completed",
+                        "content": [
+                            {"type": "output_text", "text": output, "annotations": []}
+                        ],
+                    }
+                ],
+                "parallel_tool_calls": True,
+                "tool_choice": "auto",
+                "tools": [],
+                "usage": {
+                    **usage,
+                    "total_tokens": usage["input_tokens"] + usage["output_tokens"],
+                    "input_tokens_details": {"cached_tokens": 0},
+                    "output_tokens_details": {"reasoning_tokens": 0},
+                },
+            },
+        )
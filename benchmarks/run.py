@@ -0,0 +1,263 @@
+"""Offline throughput benchmark for the daily pipeline.
+
+Runs the same flow as a bare `python main.py` (preference generation, arXiv
+sync, prefilter, ranking, dedup, Notion writes, history) against the local
+fakes in `benchmarks.fakes`, once per corpus size, each in a fresh process
+so peak memory is measured per scale:
+
+    python -m benchmarks.run --scales 1000 10000 100000
+
+With `--profiles N` it runs the batch mode instead, N profiles with their
+own Notion database ranking one shared harvest.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from notion_client import Client
+from openai import OpenAI
+
+import main
+import paper_reader.arxiv
+from paper_reader.instrument import httpx_hooks, metrics
+
+from .fakes import FakeArxiv, FakeNotion, FakeOpenAI
+
+DATABASE_ID = "00000000-0000-0000-0000-00000000bench"
+STAGES = (
+    "overlap.prepare",
+    "batch.prepare",
+    "batch.rank",
+    "preference",
+    "arxiv.harvest",
+    "prefilter",
+    "rank",
+    "dedup",
+    "notion.write",
+)
+# options forwarded from the parent to every per-scale child process
+SCALE_OPTIONS = (
+    "days",
+    "max_papers",
+    "prefilter_k",
+    "library",
+    "arxiv_latency",
+    "arxiv_page_wait",
+    "arxiv_rate",
+    "shard_workers",
+    "profiles",
+    "notion_latency",
+    "notion_rate",
+    "notion_burst",
+    "openai_latency",
+    "openai_tps",
+)
+
+
+def run_scale(args, n_papers, workdir):
+    arxiv = FakeArxiv(n_papers, days=args.days, latency=args.arxiv_latency)
+    paper_reader.arxiv._session.mount("https://export.arxiv.org/", arxiv)
+    notion = FakeNotion(
+        DATABASE_ID,
+        latency=args.notion_latency,
+        rate=args.notion_rate,
+        burst=args.notion_burst,
+    )
+    profiles = [
+        {
+            "name": f"profile{k}",
+            "database_id": f"00000000-0000-0000-0000-{k:012d}",
+            "prefix": f"Profile {k} works on efficient and safe machine learning.",
+            "history_dir": os.path.join(workdir, "history", f"profile{k}"),
+            "state_dir": os.path.join(workdir, "state", f"profile{k}"),
+        }
+        for k in range(args.profiles)
+    ]
+    for database_id in [p["database_id"] for p in profiles] or [DATABASE_ID]:
+        notion.seed_library(args.library, database_id=database_id)
+    profiles_file = os.path.join(workdir, "profiles.json")
+    with open(profiles_file, "w") as f:
+        json.dump(profiles, f)
+    openai = FakeOpenAI(latency=args.openai_latency, tokens_per_second=args.openai_tps)
+
+    os.environ["NOTION_DB_ID"] = DATABASE_ID
+    cli = [
+        "--days", str(args.days),
+        "--max-papers", str(args.max_papers),
+        "--prefilter-k", str(args.prefilter_k),
+        "--history-dir", os.path.join(workdir, "history"),
+        "--paper-store", os.path.join(workdir, "arxiv.db"),
+        "--seen-file", os.path.join(workdir, "seen_ids.npz"),
+        "--dedup-index", os.path.join(workdir, "dedup_index.npz"),
+        "--notion-mirror", os.path.join(workdir, "notion_mirror.db"),
+        "--no-llm-cache",
+        "--shard-workers", str(args.shard_workers),
+        *(["--overlap"] if args.overlap else []),
+        *(["--profiles-file", profiles_file] if profiles else []),
+    ]  # fmt: skip
+    manager_kwargs = {
+        "notion": Client(
+            auth="bench", client=notion.client(event_hooks=httpx_hooks("notion"))
+        ),
+        "oai": OpenAI(
+            api_key="bench",
+            http_client=openai.client(event_hooks=httpx_hooks("openai")),
+        ),
+        "harvest_kwargs": {
+            "page_wait": args.arxiv_page_wait,
+            "shard_rate": args.arxiv_rate,
+        },
+    }
+
+    metrics.reset()
+    start = time.perf_counter()
+    with open(os.path.join(workdir, "stdout.log"), "w") as log:
+        with contextlib.redirect_stdout(log):
+            main.run(main.build_parser().parse_args(cli), **manager_kwargs)
+    wall = time.perf_counter() - start
+
+    return {
+        "papers": n_papers,
+        "wall_seconds": wall,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "fake_requests": {
+            "arxiv": dict(arxiv.requests),
+            "notion": dict(notion.requests),
+            "notion_throttled": notion.throttled,
+            "openai": dict(openai.requests),
+        },
+        "report": metrics.report(),
+    }
+
+
+def summarize(results):
+    header = (
+        f"{'papers':>8} {'wall s':>8} {'peak MiB':>9} {'arxiv':>6} "
+        f"{'notion':>7} {'429s':>5} {'llm':>4} {'tok in':>8} {'tok out':>8}  stages"
+    )
+    lines = [header]
+    for r in results:
+        services = r["report"]["services"]
+        tokens = r["report"]["tokens"].values()
+        stages = ", ".join(
+            f"{name} {span['seconds']:.2f}s"
+            for name, span in r["report"]["spans"].items()
+            if name in STAGES
+        )
+        lines.append(
+            f"{r['papers']:>8} {r['wall_seconds']:>8.2f} {r['peak_rss_mib']:>9.1f} "
+            f"{services.get('arxiv', {}).get('requests', 0):>6} "
+            f"{services.get('notion', {}).get('requests', 0):>7} "
+            f"{r['fake_requests']['notion_throttled']:>5} "
+            f"{services.get('openai', {}).get('requests', 0):>4} "
+            f"{sum(t['input_tokens'] for t in tokens):>8} "
+            f"{sum(t['output_tokens'] for t in tokens):>8}  {stages}"
+        )
+    return "\n".join(lines)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmark")
+    parser.add_argument(
+        "--scales",
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 100000],
+        help="arXiv corpus sizes to run (default: 1000 10000 100000)",
+    )
+    parser.add_argument("--days", type=int, default=7)
+    parser.add_argument("--max-papers", type=int, default=20)
+    parser.add_argument("--prefilter-k", type=int, default=150)
+    parser.add_argument(
+        "--library",
+        type=int,
+        default=500,
+        help="Pages seeded into the fake Notion database",
+    )
+    parser.add_argument("--arxiv-latency", type=float, default=0.05)
+    parser.add_argument(
+        "--arxiv-page-wait",
+        type=float,
+        default=0.0,
+        help="Politeness delay between arXiv pages (live runs use 3s)",
+    )
+    parser.add_argument(
+        "--arxiv-rate",
+        type=float,
+        default=1000.0,
+        help="Shared request rate of sharded harvests (live runs use 1/3)",
+    )
+    parser.add_argument(
+        "--shard-workers",
+        type=int,
+        default=0,
+        help="Harvest by category shards on this many workers, 0 for one combined query",
+    )
+    parser.add_argument(
+        "--overlap", action="store_true", help="Benchmark the overlapped run"
+    )
+    parser.add_argument(
+        "--profiles",
+        type=int,
+        default=0,
+        help="Benchmark the batch mode with this many profiles, 0 for a single run",
+    )
+    parser.add_argument("--notion-latency", type=float, default=0.1)
+    parser.add_argument("--notion-rate", type=float, default=3.0)
+    parser.add_argument("--notion-burst", type=int, default=10)
+    parser.add_argument("--openai-latency", type=float, default=0.3)
+    parser.add_argument("--openai-tps", type=float, default=500)
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="bench_report.json",
+        help="Where to write the per-scale results (default: bench_report.json)",
+    )
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", type=str, help=argparse.SUPPRESS)
+    return parser
+
+
+def main_cli():
+    args = build_parser().parse_args()
+    if args.single is not None:
+        # child process: one scale, results handed back through a file
+        with tempfile.TemporaryDirectory() as workdir:
+            result = run_scale(args, args.single, workdir)
+        with open(args.result_file, "w") as f:
+            json.dump(result, f)
+        return
+
+    options = []
+    for name in SCALE_OPTIONS:
+        options += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+    if args.overlap:
+        options.append("--overlap")
+    results = []
+    print(summarize([]), flush=True)
+    for n_papers in args.scales:
+        with tempfile.NamedTemporaryFile(suffix=".json") as result_file:
+            subprocess.run(
+                [sys.executable, "-m", "benchmarks.run", *options]
+                + ["--single", str(n_papers), "--result-file", result_file.name],
+                check=True,
+            )
+            with open(result_file.name) as f:
+                results.append(json.load(f))
+        print(summarize(results[-1:]).splitlines()[-1], flush=True)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main_cli()
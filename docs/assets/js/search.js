@@ -0,0 +1,107 @@
+// Client-side search over the shards written by export_papers.build_search_index.
+// Only meta.json, the postings shards for the query's token prefixes and the
+// document shards of the shown results are fetched.
+(function () {
+  var base = document.querySelector('script[src$="assets/js/search.js"]')
+    .getAttribute('src').replace(/assets\/js\/search\.js$/, '') + 'search/';
+  var cache = {};
+  var meta = null;
+  var MAX_RESULTS = 50;
+
+  function fetchJSON(path) {
+    if (!cache[path]) {
+      cache[path] = fetch(base + path).then(function (r) {
+        return r.ok ? r.json() : {};
+      });
+    }
+    return cache[path];
+  }
+
+  function tokenize(text) {
+    var stop = new Set(meta.stopwords);
+    return (text.toLowerCase().match(/[a-z0-9]+/g) || []).filter(function (t) {
+      return !stop.has(t);
+    });
+  }
+
+  // document ids for every indexed token starting with `term`
+  function lookup(term) {
+    var prefix = term.slice(0, meta.prefix_len);
+    if (meta.prefixes.indexOf(prefix) < 0) return Promise.resolve(new Set());
+    return fetchJSON('idx/' + prefix + '.json').then(function (shard) {
+      var ids = new Set();
+      Object.keys(shard).forEach(function (token) {
+        if (token.indexOf(term) !== 0) return;
+        var id = 0;
+        shard[token].forEach(function (gap) {
+          id += gap;
+          ids.add(id);
+        });
+      });
+      return ids;
+    });
+  }
+
+  function escape(text) {
+    var div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+  }
+
+  function render(query, ids) {
+    var status = document.getElementById('search-status');
+    var results = document.getElementById('search-results');
+    // ids follow the history, oldest first, so the newest come from the end
+    var shown = ids.slice().sort(function (a, b) { return b - a; }).slice(0, MAX_RESULTS);
+    var shards = Array.from(new Set(shown.map(function (id) {
+      return Math.floor(id / meta.doc_shard_size);
+    })));
+    return Promise.all(shards.map(function (s) {
+      return fetchJSON('docs/' + s + '.json').then(function (docs) { return [s, docs]; });
+    })).then(function (loaded) {
+      if (document.getElementById('search-box').value !== query) return;
+      var byShard = {};
+      loaded.forEach(function (pair) { byShard[pair[0]] = pair[1]; });
+      var docs = shown.map(function (id) {
+        return byShard[Math.floor(id / meta.doc_shard_size)][id % meta.doc_shard_size];
+      });
+      docs.sort(function (a, b) { return a[2] < b[2] ? 1 : -1; });
+      status.textContent = ids.length + ' matching papers' +
+        (ids.length > MAX_RESULTS ? ', showing the ' + MAX_RESULTS + ' most recently added' : '');
+      results.innerHTML = docs.map(function (d) {
+        var link = d[3] ? ' <a href="https://arxiv.org/abs/' + escape(d[3]) +
+          '" class="arxiv-link">📄 View on arXiv</a>' : '';
+        return '<h3>' + escape(d[0]) + '</h3><div class="paper-meta">' +
+          escape(d[1]) + '<br><a href="days/' + d[2] + '.html">' + d[2] + '</a>' +
+          link + '</div>';
+      }).join('');
+    });
+  }
+
+  function search(query) {
+    var terms = tokenize(query);
+    if (!terms.length) {
+      document.getElementById('search-status').textContent = '';
+      document.getElementById('search-results').innerHTML = '';
+      return;
+    }
+    // every term has to match (as a prefix of some token)
+    Promise.all(terms.map(lookup)).then(function (sets) {
+      var ids = Array.from(sets[0]).filter(function (id) {
+        return sets.every(function (s) { return s.has(id); });
+      });
+      return render(query, ids);
+    });
+  }
+
+  fetchJSON('meta.json').then(function (m) {
+    meta = m;
+    var box = document.getElementById('search-box');
+    var timer = null;
+    box.addEventListener('input', function () {
+      clearTimeout(timer);
+      timer = setTimeout(function () { search(box.value); }, 150);
+    });
+    if (box.value) search(box.value);
+  });
+})();
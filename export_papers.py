@@ -1,27 +1,27 @@
 #!/usr/bin/env python3
 """
-Script to convert new_paper.pkl to markdown format for static website.
+Script to convert the latest recommended papers to markdown format for static website.
 """
 
-import pickle
+import hashlib
 import json
 import os
-import pydantic
 from datetime import datetime
 from typing import List, Dict, Any
 
+from paper_reader.history import PaperHistory
+from paper_reader.tokens import STOPWORDS, tokenize
 
-def load_papers_from_pickle(pickle_file: str = "new_paper.pkl") -> List[Dict[str, Any]]:
-    """Load papers from pickle file"""
+
+def load_latest_papers(history_dir: str = "history") -> List[Dict[str, Any]]:
+    """Load the papers of the latest run from the history store"""
     try:
-        with open(pickle_file, 'rb') as f:
-            papers = pickle.load(f)
+        papers = PaperHistory(history_dir).latest_run()
+        if not papers:
+            print(f"Warning: no papers in {history_dir}. No papers to export.")
         return papers
-    except FileNotFoundError:
-        print(f"Warning: {pickle_file} not found. No papers to export.")
-        return []
     except Exception as e:
-        print(f"Error loading {pickle_file}: {e}")
+        print(f"Error loading {history_dir}: {e}")
         return []
 
 
@@ -61,56 +61,21 @@ def convert_paper_to_dict(paper) -> Dict[str, Any]:
         }
 
 
-def export_to_markdown(papers: List[Any], output_file: str = "docs/index.md") -> None:
-    """Export papers to markdown format"""
-    try:
-        # Convert papers to dict format
-        papers_data = []
-        for paper in papers:
-            paper_dict = convert_paper_to_dict(paper)
-            papers_data.append(paper_dict)
-        
-        # Ensure output directory exists
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
-        
-        # Generate markdown content
-        markdown_content = f"""
+def _paper_markdown(i: int, paper: Dict[str, Any]) -> str:
+    """Render one paper as a markdown section"""
+    # Clean up the paper data
+    title = paper.get('name', 'Unknown Title')
+    authors = paper.get('authors', '')
+    arxiv_id = paper.get('arxiv_id', '')
+    summary = paper.get('summary', 'No summary available.')
 
-<div class="stats">
-<strong>Last Updated:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}<br>
-<strong>Total Papers:</strong> {len(papers_data)}
-</div>
+    # Format authors
+    authors_text = f"Authors: {authors}" if authors else ""
 
----
+    # Format arXiv link
+    arxiv_link = f'<a href="https://arxiv.org/abs/{arxiv_id}" class="arxiv-link">📄 View on arXiv</a>' if arxiv_id else ""
 
-"""
-        
-        if not papers_data:
-            markdown_content += """
-<div class="no-papers">
-<h2>No New Papers Found</h2>
-<p>Check back later for new research papers!</p>
-</div>
-
----
-
-*This page is automatically updated when new papers are added to your collection.*
-"""
-        else:
-            for i, paper in enumerate(papers_data, 1):
-                # Clean up the paper data
-                title = paper.get('name', 'Unknown Title')
-                authors = paper.get('authors', '')
-                arxiv_id = paper.get('arxiv_id', '')
-                summary = paper.get('summary', 'No summary available.')
-                
-                # Format authors
-                authors_text = f"Authors: {authors}" if authors else ""
-                
-                # Format arXiv link
-                arxiv_link = f'<a href="https://arxiv.org/abs/{arxiv_id}" class="arxiv-link">📄 View on arXiv</a>' if arxiv_id else ""
-                
-                markdown_content += f"""
+    return f"""
 ## {i}. {title}
 
 <div class="paper-meta">
@@ -132,13 +97,43 @@ def export_to_markdown(papers: List[Any], output_file: str = "docs/index.md") ->
 ---
 
 """
-        
-        # Write markdown file
+
+
+def export_to_markdown(papers: List[Any], output_file: str = "docs/index.md", footer: str = "") -> None:
+    """Export papers to markdown format"""
+    try:
+        # Ensure output directory exists
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+
+        # Stream the page out paper by paper
         with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(markdown_content)
-        
-        print(f"Exported {len(papers_data)} papers to {output_file}")
-        
+            f.write(f"""
+
+<div class="stats">
+<strong>Last Updated:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}<br>
+<strong>Total Papers:</strong> {len(papers)}
+</div>
+
+---
+
+""")
+            if not papers:
+                f.write("""
+<div class="no-papers">
+<h2>No New Papers Found</h2>
+<p>Check back later for new research papers!</p>
+</div>
+
+---
+
+*This page is automatically updated when new papers are added to your collection.*
+""")
+            for i, paper in enumerate(papers, 1):
+                f.write(_paper_markdown(i, convert_paper_to_dict(paper)))
+            f.write(footer)
+
+        print(f"Exported {len(papers)} papers to {output_file}")
+
     except Exception as e:
         print(f"Error exporting to markdown: {e}")
 
@@ -146,49 +141,216 @@ def export_to_markdown(papers: List[Any], output_file: str = "docs/index.md") ->
 def export_to_json(papers: List[Any], output_file: str = "docs/papers.json") -> None:
     """Export papers to JSON format (for compatibility)"""
     try:
-        # Convert papers to dict format
-        papers_data = []
-        for paper in papers:
-            paper_dict = convert_paper_to_dict(paper)
-            papers_data.append(paper_dict)
-        
-        # Create output data
-        output_data = {
-            'papers': papers_data,
-            'last_updated': datetime.now().isoformat(),
-            'count': len(papers_data)
-        }
-        
         # Ensure output directory exists
         os.makedirs(os.path.dirname(output_file), exist_ok=True)
-        
-        # Write JSON file
+
+        # Stream one paper at a time instead of building the whole document
         with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(output_data, f, indent=2, ensure_ascii=False)
-        
-        print(f"Exported {len(papers_data)} papers to {output_file}")
-        
+            f.write('{"papers": [')
+            for i, paper in enumerate(papers):
+                if i:
+                    f.write(',\n')
+                json.dump(convert_paper_to_dict(paper), f, ensure_ascii=False)
+            f.write(f'], "last_updated": "{datetime.now().isoformat()}", "count": {len(papers)}}}\n')
+
+        print(f"Exported {len(papers)} papers to {output_file}")
+
     except Exception as e:
         print(f"Error exporting to JSON: {e}")
 
 
+# --- incremental site ---
+
+SITE_MANIFEST = "_site_manifest.json"
+
+
+def _load_manifest(docs_dir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(docs_dir, SITE_MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {'segments': {}, 'days': {}, 'pages': {}}
+
+
+def _save_manifest(docs_dir: str, manifest: Dict[str, Any]) -> None:
+    with open(os.path.join(docs_dir, SITE_MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+def _hash_records(records: List[Dict[str, Any]]) -> str:
+    h = hashlib.sha256()
+    for record in records:
+        h.update(json.dumps(record, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _render_day(day: str, records: List[Dict[str, Any]], docs_dir: str) -> None:
+    """Write the markdown and JSON shards of one day"""
+    days_dir = os.path.join(docs_dir, 'days')
+    os.makedirs(days_dir, exist_ok=True)
+    with open(os.path.join(days_dir, f'{day}.md'), 'w', encoding='utf-8') as f:
+        f.write(f"---\ntitle: Papers for {day}\n---\n\n[All days](../archive/)\n\n---\n")
+        for i, record in enumerate(records, 1):
+            f.write(_paper_markdown(i, record))
+    export_to_json(records, os.path.join(days_dir, f'{day}.json'))
+
+
+def _render_archive_page(page: int, days: List[List[Any]], docs_dir: str) -> None:
+    """Write one page of links to day shards"""
+    archive_dir = os.path.join(docs_dir, 'archive')
+    os.makedirs(archive_dir, exist_ok=True)
+    with open(os.path.join(archive_dir, f'page-{page}.md'), 'w', encoding='utf-8') as f:
+        f.write(f"---\ntitle: Archive page {page}\n---\n\n[All pages](./)\n\n")
+        for day, count in reversed(days):
+            f.write(f"- [{day}](../days/{day}.html) ({count} papers)\n")
+
+
+def build_site(history_dir: str = "history", docs_dir: str = "docs", days_per_page: int = 30) -> None:
+    """Incrementally render per-day shards and paginated archive pages
+
+    A manifest in the docs directory remembers, for each history segment,
+    the record count it was last rendered from and, for each day and
+    archive page, a hash of its inputs. Segments whose count is unchanged
+    are not read at all, and only shards whose hash changed are rewritten,
+    so a daily rebuild touches the current month and the newest page only.
+    Archive pages are numbered from the oldest day, so older pages never
+    shift when a new day is added. The manifest, days/ and archive/ are
+    not committed; the Pages workflow keeps them in the actions cache.
+    """
+    history = PaperHistory(history_dir)
+    manifest = _load_manifest(docs_dir)
+    rendered = 0
+
+    for segment, meta in sorted(history.index['segments'].items()):
+        if manifest['segments'].get(segment) == meta['records']:
+            continue
+        # group the segment's records by day, streaming from disk
+        by_day: Dict[str, List[Dict[str, Any]]] = {}
+        for record in history.iter_papers(start=meta['first'], end=meta['last']):
+            by_day.setdefault(record['date'], []).append(record)
+        for day, records in by_day.items():
+            digest = _hash_records(records)
+            day_file = os.path.join(docs_dir, 'days', f'{day}.md')
+            if manifest['days'].get(day, {}).get('hash') != digest or not os.path.exists(day_file):
+                _render_day(day, records, docs_dir)
+                rendered += 1
+            manifest['days'][day] = {'hash': digest, 'count': len(records)}
+        manifest['segments'][segment] = meta['records']
+
+    days = sorted(manifest['days'].items())
+    pages = [days[i:i + days_per_page] for i in range(0, len(days), days_per_page)]
+    for page, page_days in enumerate(pages, 1):
+        entries = [[day, info['count']] for day, info in page_days]
+        digest = _hash_records([{'days': entries}])
+        if manifest['pages'].get(str(page)) != digest:
+            _render_archive_page(page, entries, docs_dir)
+            manifest['pages'][str(page)] = digest
+            rendered += 1
+
+    # the archive index is tiny: one link per page
+    archive_dir = os.path.join(docs_dir, 'archive')
+    os.makedirs(archive_dir, exist_ok=True)
+    with open(os.path.join(archive_dir, 'index.md'), 'w', encoding='utf-8') as f:
+        f.write(f"---\ntitle: Archive\n---\n\n{len(history)} papers over {len(days)} days.\n\n")
+        for page in range(len(pages), 0, -1):
+            first, last = pages[page - 1][0][0], pages[page - 1][-1][0]
+            f.write(f"- [{first} to {last}](page-{page}.html)\n")
+
+    _save_manifest(docs_dir, manifest)
+    print(f"Rendered {rendered} changed shards out of {len(days)} days and {len(pages)} archive pages")
+
+
+# --- search index ---
+
+SEARCH_DOC_SHARD_SIZE = 500
+
+
+def _write_json_if_changed(path: str, data: Any) -> bool:
+    """Write compact JSON, leaving the file untouched when its content is the same"""
+    text = json.dumps(data, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+    try:
+        with open(path, encoding='utf-8') as f:
+            if f.read() == text:
+                return False
+    except FileNotFoundError:
+        pass
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return True
+
+
+def build_search_index(history_dir: str = "history", docs_dir: str = "docs", prefix_len: int = 2) -> None:
+    """Precompute a sharded inverted index for client-side search
+
+    Every recommended paper gets a document id (repeat recommendations
+    share one). Titles, authors and abstracts are tokenised like the
+    ranking prefilter, and postings are split into one shard per
+    `prefix_len`-character token prefix, delta-encoded. A query in the
+    browser fetches only the shards for its terms' prefixes, then the
+    document shards of the ids it shows. meta.json describes the layout.
+    """
+    search_dir = os.path.join(docs_dir, 'search')
+    os.makedirs(os.path.join(search_dir, 'idx'), exist_ok=True)
+    os.makedirs(os.path.join(search_dir, 'docs'), exist_ok=True)
+
+    doc_ids: Dict[str, int] = {}
+    docs: List[List[str]] = []
+    postings: Dict[str, Dict[str, List[int]]] = {}
+    for record in PaperHistory(history_dir).iter_papers():
+        key = record.get('arxiv_id') or record['name']
+        if key in doc_ids:
+            # keep the most recent recommendation date
+            docs[doc_ids[key]][2] = record['date']
+            continue
+        doc_id = doc_ids[key] = len(docs)
+        docs.append([record['name'], record['authors'], record['date'], record.get('arxiv_id', '')])
+        text = f"{record['name']} {record['authors']} {record['summary']}"
+        for token in set(tokenize(text)):
+            postings.setdefault(token[:prefix_len], {}).setdefault(token, []).append(doc_id)
+
+    written = 0
+    for prefix, tokens in postings.items():
+        shard = {}
+        for token, ids in tokens.items():
+            # ids are appended in increasing order, store gaps
+            shard[token] = [ids[0]] + [b - a for a, b in zip(ids, ids[1:])]
+        written += _write_json_if_changed(os.path.join(search_dir, 'idx', f'{prefix}.json'), shard)
+    for i in range(0, len(docs), SEARCH_DOC_SHARD_SIZE):
+        shard_path = os.path.join(search_dir, 'docs', f'{i // SEARCH_DOC_SHARD_SIZE}.json')
+        written += _write_json_if_changed(shard_path, docs[i:i + SEARCH_DOC_SHARD_SIZE])
+
+    _write_json_if_changed(os.path.join(search_dir, 'meta.json'), {
+        'docs': len(docs),
+        'doc_shard_size': SEARCH_DOC_SHARD_SIZE,
+        'prefix_len': prefix_len,
+        'prefixes': sorted(postings),
+        'stopwords': sorted(STOPWORDS),
+    })
+    print(f"Indexed {len(docs)} papers into {len(postings)} search shards ({written} changed)")
+
+
 def main():
     """Main function"""
-    print("Converting new_paper.pkl to markdown format...")
-    
-    # Load papers from pickle
-    papers = load_papers_from_pickle()
-    
+    print("Converting the paper history to markdown format...")
+
+    # Load papers from the history store
+    papers = load_latest_papers()
+
     if not papers:
         print("No papers found, creating empty markdown file...")
-        export_to_markdown([])
     else:
         print(f"Found {len(papers)} papers to export")
-        export_to_markdown(papers)
-    
+    export_to_markdown(papers, footer="\n[Browse all past recommendations](archive/) · [Search](search.html)\n")
+
     # Also export to JSON for compatibility
     export_to_json(papers)
-    
+
+    # Per-day shards and the paginated archive
+    build_site()
+
+    # Sharded search index for docs/search.md
+    build_search_index()
+
     print("Export completed!")
 
 
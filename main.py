@@ -1,7 +1,19 @@
 import os
+import json
 import argparse
-import pickle
+import cProfile
+import pstats
+from functools import partial
+from paper_reader.instrument import metrics
+from paper_reader.arxiv import ARXIV_CATEGORIES, ArxivCache
+from paper_reader.history import PaperHistory, migrate_pickles
 from paper_reader.notion import NotionDBManager
+from paper_reader.pipeline import add_papers_batch, add_papers_overlapped
+from paper_reader.preference import refresh_preference
+from paper_reader.seen import SeenSet
+from paper_reader.cache import DiskCache
+from paper_reader.store import ArxivStore
+from paper_reader.writer import NotionWriter
 
 prefix = """
 My primary research interest lies in enhancing the runtime efficiency of ML models, 
@@ -13,53 +25,79 @@ I am also keen to discover emerging models and learning paradigms to expand my k
 """
 
 
-def generate_preference(db, prefix, output_file="preference.pkl"):
-    """Generate user preference and save to pickle file"""
-    print("Generating user preference...")
-    prompt = db.get_user_preference(prefix)
-    with open(output_file, "wb") as f:
-        pickle.dump(prompt, f)
-    print(f"Preference saved to {output_file}")
+@metrics.timed("preference")
+def generate_preference(
+    db, prefix, history, force=True, meta_file="preference.meta.json"
+):
+    """Generate user preference and append it to the history store
+
+    With force=False the profile is only regenerated as far as the ratings
+    changed since the last run.
+    """
+    prompt = refresh_preference(db, prefix, history, meta_file=meta_file, force=force)
+    print(f"Preference saved to {history.preference_file}")
     return prompt
 
 
-def load_preference(file_path="preference.pkl"):
-    """Load user preference from pickle file"""
-    try:
-        with open(file_path, "rb") as f:
-            return pickle.load(f)
-    except FileNotFoundError:
-        print(f"Preference file {file_path} not found. Please generate it first.")
-        return None
+def load_preference(history):
+    """Load the latest user preference from the history store"""
+    prompt = history.latest_preference()
+    if prompt is None:
+        print(f"No preference found in {history.root}. Please generate it first.")
+    return prompt
 
 
-def save_new_papers(new_papers, output_file="new_paper.pkl"):
-    """Save new papers to pickle file only if new papers are found"""
+def save_new_papers(new_papers, history):
+    """Append new papers to the history store only if new papers are found"""
     if new_papers:
-        with open(output_file, "wb") as f:
-            pickle.dump(new_papers, f)
-        print(f"Saved {len(new_papers)} new papers to {output_file}")
+        history.append_run(new_papers)
+        print(f"Saved {len(new_papers)} new papers to {history.root}")
         return True
     else:
-        print("No new papers found. Not generating pickle file.")
+        print("No new papers found. Not updating the paper history.")
         return False
 
 
-def main():
+def load_profiles(path):
+    """Read the research profiles of a batch run from a JSON list.
+
+    Each entry needs a `name`, a Notion `database_id` and a `prefix`
+    describing the research interest. The preference history goes to
+    `history_dir` (default history/<name>) and the local state (seen ids,
+    dedup index, Notion mirror, preference metadata) to `state_dir`
+    (default state/<name>).
+    """
+    with open(path) as f:
+        profiles = json.load(f)
+    for profile in profiles:
+        missing = {"name", "database_id", "prefix"} - profile.keys()
+        if missing:
+            raise ValueError(f"Profile {profile} in {path} is missing {missing}")
+        profile.setdefault("history_dir", os.path.join("history", profile["name"]))
+        profile.setdefault("state_dir", os.path.join("state", profile["name"]))
+    return profiles
+
+
+def build_parser():
     parser = argparse.ArgumentParser(description="Paper Reader CLI")
     parser.add_argument(
         "--generate-preference",
         action="store_true",
-        help="Generate preference.pkl file",
+        help="Generate the preference profile",
     )
     parser.add_argument(
         "--refresh-preference",
         action="store_true",
-        help="Refresh/regenerate preference.pkl file",
+        help="Refresh/regenerate the preference profile",
     )
     parser.add_argument(
         "--add-papers", action="store_true", help="Add papers to Notion database"
     )
+    parser.add_argument(
+        "--fill-missing",
+        action="store_true",
+        help="Look up missing URLs and abstracts of the Notion papers on arxiv",
+    )
     parser.add_argument(
         "--days",
         type=int,
@@ -72,44 +110,346 @@ def main():
         default=20,
         help="Maximum number of papers to add (default: 5)",
     )
+    parser.add_argument(
+        "--prefilter-k",
+        type=int,
+        default=150,
+        help="Number of locally prefiltered candidates sent to the LLM, 0 disables (default: 150)",
+    )
+    parser.add_argument(
+        "--rank-prompt-tokens",
+        type=int,
+        default=16000,
+        help="Token budget of the paper listing in each ranking prompt (default: 16000)",
+    )
+    parser.add_argument(
+        "--preference-prompt-tokens",
+        type=int,
+        default=24000,
+        help="Token budget of the rated papers in the preference prompt (default: 24000)",
+    )
+    parser.add_argument(
+        "--history-dir",
+        type=str,
+        default="history",
+        help="Directory of the append-only paper and preference history (default: history)",
+    )
     parser.add_argument(
         "--preference-file",
         type=str,
-        default="preference.pkl",
-        help="Path to preference file (default: preference.pkl)",
+        default=None,
+        help="Deprecated, the preference now lives in --history-dir; a pickle given here is imported into it once",
+    )
+    parser.add_argument(
+        "--paper-store",
+        type=str,
+        default="arxiv.db",
+        help="Path to the local arxiv metadata store (default: arxiv.db)",
+    )
+    parser.add_argument(
+        "--no-paper-store",
+        action="store_true",
+        help="Fetch the full arxiv window on every run instead of syncing the local store",
     )
 
-    args = parser.parse_args()
+    parser.add_argument(
+        "--profiles-file",
+        type=str,
+        default=None,
+        help="JSON file of research profiles to rank one shared arxiv harvest for",
+    )
+    parser.add_argument(
+        "--overlap",
+        action="store_true",
+        help="Run the arXiv harvest, Notion sync and preference load concurrently",
+    )
+    parser.add_argument(
+        "--categories",
+        nargs="+",
+        default=list(ARXIV_CATEGORIES),
+        help=f"arXiv categories to harvest (default: {' '.join(ARXIV_CATEGORIES)})",
+    )
+    parser.add_argument(
+        "--shard-workers",
+        type=int,
+        default=0,
+        help="Harvest each category as its own shard on this many workers, 0 uses one combined query (default: 0)",
+    )
+    parser.add_argument(
+        "--shard-days",
+        type=float,
+        default=None,
+        help="With --shard-workers, also split the date window into shards of this many days",
+    )
+    parser.add_argument(
+        "--seen-file",
+        type=str,
+        default="seen_ids.npz",
+        help="Path to the set of arxiv ids ranked on earlier runs (default: seen_ids.npz)",
+    )
+    parser.add_argument(
+        "--rerank-seen",
+        action="store_true",
+        help="Send papers ranked on earlier runs to the LLM again",
+    )
+    parser.add_argument(
+        "--dedup-index",
+        type=str,
+        default="dedup_index.npz",
+        help="Path to the duplicate title index of the Notion database (default: dedup_index.npz)",
+    )
+    parser.add_argument(
+        "--notion-mirror",
+        type=str,
+        default="notion_mirror.db",
+        help="Path to the local mirror of the Notion database (default: notion_mirror.db)",
+    )
+    parser.add_argument(
+        "--full-sync",
+        action="store_true",
+        help="Re-read the whole Notion database, dropping pages deleted since the last full sync",
+    )
+    parser.add_argument(
+        "--full-sync-days",
+        type=float,
+        default=7,
+        help="Days between automatic full syncs of the Notion mirror (default: 7)",
+    )
+    parser.add_argument(
+        "--llm-cache",
+        type=str,
+        default="llm_cache.db",
+        help="Path to the OpenAI response cache (default: llm_cache.db)",
+    )
+    parser.add_argument(
+        "--llm-cache-days",
+        type=float,
+        default=30,
+        help="Days before a cached OpenAI response expires (default: 30)",
+    )
+    parser.add_argument(
+        "--no-llm-cache",
+        action="store_true",
+        help="Always query OpenAI, bypassing the response cache",
+    )
+    parser.add_argument(
+        "--arxiv-cache",
+        type=str,
+        default="arxiv_cache.db",
+        help="Path to the cache of arxiv title and id lookups (default: arxiv_cache.db)",
+    )
+    parser.add_argument(
+        "--no-arxiv-cache",
+        action="store_true",
+        help="Always query arxiv for title and id lookups, bypassing the cache",
+    )
+    parser.add_argument(
+        "--report-file",
+        type=str,
+        default="run_report.json",
+        help="Where to write the JSON run report with stage timings, requests and tokens (default: run_report.json)",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        nargs="?",
+        const="run.prof",
+        default=None,
+        help="Dump a cProfile of the run to this file (default when given: run.prof)",
+    )
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+
+    response_cache = None
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        response_cache = run(args)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print(f"Profile written to {args.profile}")
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+        cache_stats = response_cache.stats() if response_cache is not None else None
+        metrics.write_report(args.report_file, llm_cache=cache_stats)
+        print(f"Run report written to {args.report_file}")
+
+
+def add_new_papers(db, history, args, prepare_preference):
+    """Rank and add new papers, then record them in the history"""
+    add_kwargs = dict(
+        past_days=args.days,
+        max_papers=args.max_papers,
+        prefilter_k=args.prefilter_k,
+        rerank_seen=args.rerank_seen,
+    )
+    if args.overlap:
+        new_papers = add_papers_overlapped(db, prepare_preference, **add_kwargs)
+    else:
+        prompt = prepare_preference()
+        if not prompt:
+            return
+        new_papers = db.add_papers(prompt, **add_kwargs)
+    has_new_papers = save_new_papers(new_papers, history)
+    if has_new_papers:
+        # Regenerate preference file only if new papers were added
+        generate_preference(db, prefix, history, force=False)
+
+
+def shared_resources(args, manager_kwargs):
+    """Paper store, caches, harvest, prompt budget and mirror settings of a run"""
+    harvest_kwargs = {"categories": args.categories}
+    if args.shard_workers:
+        harvest_kwargs.update(
+            shard_workers=args.shard_workers, shard_days=args.shard_days
+        )
+    harvest_kwargs.update(manager_kwargs.pop("harvest_kwargs", {}))
+
+    paper_store = None if args.no_paper_store else ArxivStore(args.paper_store)
+    response_cache = None
+    if not args.no_llm_cache:
+        response_cache = DiskCache(
+            args.llm_cache, default_ttl=args.llm_cache_days * 86400
+        )
+    arxiv_cache = None if args.no_arxiv_cache else ArxivCache(args.arxiv_cache)
+    return dict(
+        paper_store=paper_store,
+        response_cache=response_cache,
+        arxiv_cache=arxiv_cache,
+        harvest_kwargs=harvest_kwargs,
+        rank_prompt_tokens=args.rank_prompt_tokens,
+        preference_prompt_tokens=args.preference_prompt_tokens,
+        full_sync=args.full_sync,
+        full_sync_days=args.full_sync_days,
+    )
+
+
+def prepare_profile_preference(db, prefix, history, meta_file, regenerate=False):
+    """Latest preference of a batch profile, generated if there is none yet"""
+    prompt = None if regenerate else history.latest_preference()
+    if not prompt:
+        prompt = generate_preference(db, prefix, history, meta_file=meta_file)
+    return prompt
+
+
+def run_batch(args, **manager_kwargs):
+    """Rank one shared arxiv harvest for every profile in `args.profiles_file`"""
+    profiles = load_profiles(args.profiles_file)
+    shared = shared_resources(args, manager_kwargs)
+    # all profiles use the same integration, and so one rate limit
+    shared["writer"] = NotionWriter()
+
+    dbs, histories, loaders, meta_files = [], [], [], []
+    for profile in profiles:
+        state_dir = profile["state_dir"]
+        os.makedirs(state_dir, exist_ok=True)
+        history = PaperHistory(profile["history_dir"])
+        meta_file = os.path.join(state_dir, "preference.meta.json")
+        db = NotionDBManager(
+            profile["database_id"],
+            mirror_path=os.path.join(state_dir, "notion_mirror.db"),
+            seen_set=SeenSet(os.path.join(state_dir, "seen_ids.npz")),
+            dedup_path=os.path.join(state_dir, "dedup_index.npz"),
+            **shared,
+            **manager_kwargs,
+        )
+        dbs.append(db)
+        histories.append(history)
+        loaders.append(
+            partial(
+                prepare_profile_preference,
+                db,
+                profile["prefix"],
+                history,
+                meta_file,
+                regenerate=args.generate_preference or args.refresh_preference,
+            )
+        )
+        meta_files.append(meta_file)
+
+    print(f"Ranking one arxiv harvest for {len(profiles)} profiles.")
+    results = add_papers_batch(
+        dbs,
+        loaders,
+        past_days=args.days,
+        max_papers=args.max_papers,
+        prefilter_k=args.prefilter_k,
+        rerank_seen=args.rerank_seen,
+    )
+    for profile, db, history, meta_file, new_papers in zip(
+        profiles, dbs, histories, meta_files, results
+    ):
+        print(f"Profile {profile['name']}:")
+        if save_new_papers(new_papers, history):
+            generate_preference(
+                db, profile["prefix"], history, force=False, meta_file=meta_file
+            )
+
+    response_cache = shared["response_cache"]
+    if response_cache is not None:
+        print(f"LLM response cache: {response_cache.stats()}")
+    return response_cache
+
+
+def run(args, **manager_kwargs):
+    if args.profiles_file:
+        return run_batch(args, **manager_kwargs)
 
-    database_id = os.environ["NOTION_DB_ID"]
-    db = NotionDBManager(database_id)
+    history = PaperHistory(args.history_dir)
+    if args.preference_file:
+        print(
+            "--preference-file is deprecated, the preference is kept in --history-dir."
+        )
+        migrate_pickles(history, preference_file=args.preference_file)
+    else:
+        migrate_pickles(history)
+
+    shared = shared_resources(args, manager_kwargs)
+    response_cache = shared["response_cache"]
+    db = NotionDBManager(
+        os.environ["NOTION_DB_ID"],
+        mirror_path=args.notion_mirror,
+        seen_set=SeenSet(args.seen_file),
+        dedup_path=args.dedup_index,
+        **shared,
+        **manager_kwargs,
+    )
 
     if args.generate_preference or args.refresh_preference:
-        generate_preference(db, prefix, args.preference_file)
+        generate_preference(db, prefix, history)
 
     if args.add_papers:
-        prompt = load_preference(args.preference_file)
-        if prompt:
-            new_papers = db.add_papers(
-                prompt, past_days=args.days, max_papers=args.max_papers
-            )
-            has_new_papers = save_new_papers(new_papers)
-            if has_new_papers:
-                # Regenerate preference file only if new papers were added
-                generate_preference(db, prefix, args.preference_file)
+        add_new_papers(db, history, args, lambda: load_preference(history))
+
+    if args.fill_missing:
+        db.fill_missing_url_and_abstract()
 
     # If no arguments provided, run default behavior, house keeping daily runs
-    if not any([args.generate_preference, args.refresh_preference, args.add_papers]):
-        prompt = load_preference(args.preference_file)
-        if not prompt:
-            prompt = generate_preference(db, prefix, args.preference_file)
-        new_papers = db.add_papers(
-            prompt, past_days=args.days, max_papers=args.max_papers
-        )
-        has_new_papers = save_new_papers(new_papers)
-        if has_new_papers:
-            # Regenerate preference file only if new papers were added
-            generate_preference(db, prefix, args.preference_file)
+    if not any(
+        [
+            args.generate_preference,
+            args.refresh_preference,
+            args.add_papers,
+            args.fill_missing,
+        ]
+    ):
+
+        def prepare_preference():
+            prompt = load_preference(history)
+            if not prompt:
+                prompt = generate_preference(db, prefix, history)
+            return prompt
+
+        add_new_papers(db, history, args, prepare_preference)
+
+    if response_cache is not None:
+        print(f"LLM response cache: {response_cache.stats()}")
+    return response_cache
 
 
 if __name__ == "__main__":
@@ -1,103 +1,532 @@
+import os
+import re
+import json
+import difflib
 import requests
-import feedparser
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
+from .atom import ParseError, parse_feed
+from .cache import DiskCache
+from .instrument import metrics, requests_hook
+from .ratelimit import TokenBucket
 
-def search_arxiv_abstract(
-    paper_title, max_results=1, timeout=5, max_retries=3, retry_wait=2, return_all=False
-):
-    search_query = 'ti:"{}"'.format(paper_title)
-    url = f"https://export.arxiv.org/api/query?search_query={search_query}&start=0&max_results={max_results}"
+ARXIV_API_URL = "https://export.arxiv.org/api/query"
+# machine learning, AI and hardware architecture, full list available at
+# https://arxiv.org/category_taxonomy
+ARXIV_CATEGORIES = ("cs.LG", "cs.AI", "cs.AR")
+# arXiv asks for no more than one request every three seconds
+ARXIV_RATE = 1 / 3
+
+# one pooled session for every arxiv call, so batches reuse the connection
+_session = requests.Session()
+_session.hooks["response"].append(requests_hook("arxiv"))
+
+# a truncated or garbled body is retried like a failed request
+FETCH_ERRORS = (requests.exceptions.RequestException, ParseError)
+
+# found papers rarely change, titles that were not found may appear later
+FOUND_TTL = 30 * 86400
+MISSING_TTL = 3 * 86400
+# expired responses are kept this much longer to be revalidated
+STALE_TTL = 30 * 86400
+
+
+def query_url(params):
+    """Canonical API url of a query, with its parameters in sorted order."""
+    request = requests.Request("GET", ARXIV_API_URL, params=sorted(params.items()))
+    return request.prepare().url
+
+
+class ArxivCache:
+    """On-disk cache of arXiv API lookups, keyed by canonical query url.
+
+    Stores the parsed entries of each response. Responses with entries stay
+    fresh for `found_ttl` seconds and empty ones for `missing_ttl`, so a
+    title that is not on arXiv is only searched for again that often.
+    Expired responses are kept `stale_ttl` longer and, if arXiv sent an
+    ETag or Last-Modified header, revalidated with a conditional request.
+    Past `max_bytes` the least recently read responses are evicted.
+    """
+
+    def __init__(
+        self,
+        path="arxiv_cache.db",
+        found_ttl=FOUND_TTL,
+        missing_ttl=MISSING_TTL,
+        stale_ttl=STALE_TTL,
+        max_bytes=64 * 2**20,
+    ):
+        self.found_ttl = found_ttl
+        self.missing_ttl = missing_ttl
+        self.stale_ttl = stale_ttl
+        self.cache = DiskCache(path, default_ttl=None, max_bytes=max_bytes)
+
+    def lookup(self, url):
+        """`(entries, fresh, validators)`, entries is None if nothing is cached."""
+        record = self.cache.get(url)
+        if record is None:
+            return None, False, {}
+        fresh = time.time() < record["fresh_until"]
+        validators = {}
+        if record.get("etag"):
+            validators["If-None-Match"] = record["etag"]
+        if record.get("last_modified"):
+            validators["If-Modified-Since"] = record["last_modified"]
+        return record["entries"], fresh, validators
+
+    def store(self, url, entries, headers=None, previous=None):
+        # a 304 may leave out the validators, so the previous ones carry over
+        headers = headers or {}
+        previous = previous or {}
+        ttl = self.found_ttl if entries else self.missing_ttl
+        record = {
+            "entries": entries,
+            "fresh_until": time.time() + ttl,
+            "etag": headers.get("ETag") or previous.get("If-None-Match"),
+            "last_modified": headers.get("Last-Modified")
+            or previous.get("If-Modified-Since"),
+        }
+        self.cache.put(url, record, ttl=ttl + self.stale_ttl)
+
+
+def _fetch_feed(params, timeout=10, max_retries=3, retry_wait=2, cache=None):
+    # retries with a growing wait, arxiv asks for ~3s between calls anyway
+    url = query_url(params)
+    cached, validators = None, {}
+    if cache is not None:
+        cached, fresh, validators = cache.lookup(url)
+        if fresh:
+            metrics.count("arxiv.cache.hit")
+            return cached
 
     for attempt in range(1, max_retries + 1):
         try:
-            response = requests.get(url, timeout=timeout)
+            response = _session.get(url, headers=validators, timeout=timeout)
+            if response.status_code == 304 and cached is not None:
+                metrics.count("arxiv.cache.revalidated")
+                cache.store(url, cached, response.headers, previous=validators)
+                return cached
             response.raise_for_status()
-            feed = feedparser.parse(response.text)
+            with metrics.span("arxiv.parse"):
+                entries = parse_feed(response.content)[1]
+        except FETCH_ERRORS:
+            if attempt == max_retries:
+                raise
+            time.sleep(retry_wait * attempt)
+            continue
+        if cache is not None:
+            cache.store(url, entries, response.headers)
+        return entries
 
-            if feed.entries:
-                abstracts = [entry.summary for entry in feed.entries]
-                if return_all:
-                    return abstracts
-                else:
-                    return abstracts[0]
+
+def normalize_title(title):
+    # lowercase, drop latex markup and punctuation, collapse whitespace
+    title = re.sub(r"\\[a-zA-Z]+|[${}]", " ", title.lower())
+    title = re.sub(r"[^a-z0-9]+", " ", title)
+    return " ".join(title.split())
+
+
+def _match_title(title, by_title, cutoff):
+    key = normalize_title(title)
+    if key in by_title:
+        return by_title[key]
+    close = difflib.get_close_matches(key, by_title.keys(), n=1, cutoff=cutoff)
+    return by_title[close[0]] if close else None
+
+
+def _id_params(ids):
+    return {"id_list": ",".join(ids), "max_results": len(ids)}
+
+
+def _title_params(titles):
+    query = " OR ".join('ti:"{}"'.format(normalize_title(title)) for title in titles)
+    return {"search_query": query, "start": 0, "max_results": 3 * len(titles)}
+
+
+def search_arxiv_batch(
+    titles=(),
+    ids=(),
+    batch_size=20,
+    page_wait=3,
+    cutoff=0.9,
+    timeout=10,
+    max_retries=3,
+    retry_wait=2,
+    cache=None,
+):
+    """Look up many papers with a handful of API calls.
+
+    Titles are OR'ed together as `ti:"..."` phrase queries, `batch_size` per
+    request, and the returned entries are matched back to the inputs by
+    normalised title, falling back to a fuzzy match above `cutoff`. Known
+    arXiv ids go through `id_list` instead. Returns a dict mapping each
+    input title or id to `{"title", "abstract", "url", "arxiv_id"}`, or
+    None when nothing matched or the request kept failing.
+
+    With an `ArxivCache`, every title and id is cached on its own, under the
+    url of a query for just that item, so later calls only fetch what is
+    new or expired however the batches fall. A batch that fills its
+    `max_results` may have cut off some items' entries, so its misses are
+    looked up again one by one rather than cached as not found.
+    """
+    results = {}
+    requests_made = 0
+
+    def fetch(params, n_items):
+        nonlocal requests_made
+        if requests_made:
+            time.sleep(page_wait)
+        requests_made += 1
+        try:
+            # a one item query has that item's url, so it goes through the
+            # cache and can be revalidated
+            return _fetch_feed(
+                params,
+                timeout,
+                max_retries,
+                retry_wait,
+                cache=cache if n_items == 1 else None,
+            )
+        except FETCH_ERRORS:
+            return None
+
+    def cached(params):
+        if cache is None:
+            return None
+        entries, fresh, _ = cache.lookup(query_url(params))
+        if not fresh:
+            return None
+        metrics.count("arxiv.cache.hit")
+        return entries
+
+    def lookup(items, params_of, match):
+        pending = []
+        for item in items:
+            entries = cached(params_of([item]))
+            if entries is None:
+                pending.append(item)
             else:
-                return [] if return_all else None
+                entry = match(item, entries)
+                results[item] = _entry_to_info(entry) if entry else None
+        batches = [
+            pending[i : i + batch_size] for i in range(0, len(pending), batch_size)
+        ]
+        while batches:
+            batch = batches.pop(0)
+            params = params_of(batch)
+            entries = fetch(params, len(batch))
+            full = entries is not None and len(entries) >= params["max_results"]
+            for item in batch:
+                entry = match(item, entries or [])
+                if entry is None and full and len(batch) > 1:
+                    # other items' entries may have crowded it out of the page
+                    batches.append([item])
+                    continue
+                results[item] = _entry_to_info(entry) if entry else None
+                # failed requests are not cached as misses
+                if cache is not None and entries is not None and len(batch) > 1:
+                    cache.store(query_url(params_of([item])), [entry] if entry else [])
 
-        except (requests.exceptions.RequestException, Exception) as e:
-            if attempt == max_retries:
-                return [] if return_all else None
-            time.sleep(retry_wait)
+    def match_id(arxiv_id, entries):
+        found = {arxiv_id_from_url(entry["id"]): entry for entry in entries}
+        return found.get(arxiv_id_from_url(arxiv_id))
+
+    def match_title(title, entries):
+        by_title = {}
+        for entry in entries:
+            by_title.setdefault(normalize_title(entry["title"]), entry)
+        return _match_title(title, by_title, cutoff)
+
+    lookup(list(dict.fromkeys(ids)), _id_params, match_id)
+
+    titles = list(dict.fromkeys(titles))
+    for title in titles:
+        if not normalize_title(title):
+            results[title] = None
+    titles = [title for title in titles if title not in results]
+    lookup(titles, _title_params, match_title)
+    return results
+
+
+def search_arxiv_abstract(
+    paper_title,
+    max_results=1,
+    timeout=5,
+    max_retries=3,
+    retry_wait=2,
+    return_all=False,
+    cache=None,
+):
+    if return_all:
+        params = {
+            "search_query": 'ti:"{}"'.format(paper_title),
+            "start": 0,
+            "max_results": max_results,
+        }
+        try:
+            entries = _fetch_feed(params, timeout, max_retries, retry_wait, cache)
+        except FETCH_ERRORS:
+            return []
+        return [entry["summary"] for entry in entries]
+
+    info = search_arxiv_paper_info(
+        paper_title,
+        timeout=timeout,
+        max_retries=max_retries,
+        retry_wait=retry_wait,
+        cache=cache,
+    )
+    return info["abstract"] if info else None
 
 
 def search_arxiv_paper_info(
-    paper_title, max_results=1, timeout=5, max_retries=3, retry_wait=2
+    paper_title, max_results=1, timeout=5, max_retries=3, retry_wait=2, cache=None
 ):
     """Search for paper information including abstract and URL"""
-    search_query = 'ti:"{}"'.format(paper_title)
-    url = f"https://export.arxiv.org/api/query?search_query={search_query}&start=0&max_results={max_results}"
+    return search_arxiv_batch(
+        titles=[paper_title],
+        timeout=timeout,
+        max_retries=max_retries,
+        retry_wait=retry_wait,
+        cache=cache,
+    )[paper_title]
 
-    for attempt in range(1, max_retries + 1):
-        try:
-            response = requests.get(url, timeout=timeout)
-            response.raise_for_status()
-            feed = feedparser.parse(response.text)
-
-            if feed.entries:
-                entry = feed.entries[0]
-                # Extract arxiv ID from the entry ID
-                arxiv_id = entry.id.split("/")[-1]
-                return {
-                    "abstract": entry.summary,
-                    "url": f"https://arxiv.org/abs/{arxiv_id}",
-                    "arxiv_id": arxiv_id,
-                }
-            else:
-                return None
 
-        except (requests.exceptions.RequestException, Exception) as e:
-            if attempt == max_retries:
-                return None
-            time.sleep(retry_wait)
+def _entry_to_info(entry):
+    # Extract arxiv ID from the entry ID
+    arxiv_id = entry["id"].split("/abs/")[-1]
+    return {
+        "title": " ".join(entry["title"].split()),
+        "abstract": entry["summary"],
+        "url": f"https://arxiv.org/abs/{arxiv_id}",
+        "arxiv_id": arxiv_id,
+    }
+
 
+def arxiv_id_from_url(url):
+    # http://arxiv.org/abs/2401.01234v2 -> 2401.01234
+    arxiv_id = url.rstrip("/").split("/abs/")[-1]
+    return re.sub(r"v\d+$", "", arxiv_id)
+
+
+def _load_checkpoint(checkpoint):
+    if checkpoint and os.path.exists(checkpoint):
+        with open(checkpoint) as f:
+            return json.load(f)
     return None
 
 
-def get_recent_arxiv_papers(max_results=1000, days_ago=1):
+def _save_checkpoint(checkpoint, state):
+    tmp = checkpoint + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, checkpoint)
+
+
+def iter_recent_arxiv_papers(
+    days_ago=1,
+    since=None,
+    until=None,
+    categories=ARXIV_CATEGORIES,
+    max_results=None,
+    page_size=200,
+    page_wait=3,
+    timeout=10,
+    max_retries=3,
+    retry_wait=2,
+    checkpoint=None,
+    throttle=None,
+    shard_workers=0,
+    shard_days=None,
+    shard_rate=ARXIV_RATE,
+):
+    """Yield recent papers page by page, following the API's start offset.
+
+    arXiv asks clients to wait ~3s between consecutive calls, so `page_wait`
+    seconds are slept before every page after the first, unless a `throttle`
+    callable is given, which is then called before every page instead.
+    `since` and `until` (UTC datetimes) override the bounds of the `days_ago`
+    window. A page that fails, or comes back empty before `start` reaches the
+    reported total, is fetched again up to `max_retries` times.
+
+    When `checkpoint` is a file path, the query and the offset of the next
+    unfinished page are stored there after each page, and a later call
+    resumes from it. The checkpoint is removed once the window is exhausted.
+    A resumed call only yields the pages after the checkpoint, so it is only
+    useful to a consumer that persists papers as it reads them.
+
+    With `shard_workers` > 0 the window is harvested by
+    `harvest_arxiv_shards` instead, and the merged papers are yielded newest
+    first. That path collects every shard in memory and takes no checkpoint.
+    """
     assert 0 < days_ago, "days_ago should be be greater than 0"
-    # Compute date range in arXiv format: 20240614
-    end_date = datetime.utcnow()
-    start_date = end_date - timedelta(days=days_ago)
-    start_str = start_date.strftime("%Y%m%d%H%M")
-    end_str = end_date.strftime("%Y%m%d%H%M")
+    if shard_workers:
+        assert checkpoint is None, "sharded harvests cannot resume from a checkpoint"
+        papers = harvest_arxiv_shards(
+            days_ago=days_ago,
+            since=since,
+            until=until,
+            categories=categories,
+            shard_days=shard_days,
+            max_workers=shard_workers,
+            rate=shard_rate,
+            page_size=page_size,
+            timeout=timeout,
+            max_retries=max_retries,
+            retry_wait=retry_wait,
+        )
+        yield from papers[:max_results]
+        return
+
+    since_str = since.strftime("%Y%m%d%H%M") if since else None
+    query = "+OR+".join(f"cat:{category}" for category in categories)
+    state = _load_checkpoint(checkpoint)
+    if (
+        state is None
+        or state.get("days_ago") != days_ago
+        or state.get("since") != since_str
+        or state.get("query") != query
+    ):
+        # Compute date range in arXiv format: 202406141200
+        end_date = until or datetime.utcnow()
+        start_date = since or end_date - timedelta(days=days_ago)
+        state = {
+            "days_ago": days_ago,
+            "since": since_str,
+            "query": query,
+            "start_str": start_date.strftime("%Y%m%d%H%M"),
+            "end_str": end_date.strftime("%Y%m%d%H%M"),
+            "start": 0,
+        }
 
     base_url = "https://export.arxiv.org/api/"
-    # query focuses on machine learning, AI and hardware architecture categories
-    # Change this to your desired categories, full list available at https://arxiv.org/category_taxonomy
-    query = "cat:cs.LG+OR+cat:cs.AI+OR+cat:cs.AR+"
-    url = f"{base_url}query?search_query={query}"
-    url += f"+AND+submittedDate:[{start_str}+TO+{end_str}]"
-    url += f"&max_results={max_results}&sortBy=submittedDate&sortOrder=descending"
-
-    resp = requests.get(url, timeout=10)
-    resp.raise_for_status()
-    feed = feedparser.parse(resp.text)
-
-    papers = []
-    i = 0
-    for entry in feed.entries:
-        # Parse the published date
-        papers.append(
-            {
-                "title": entry.title,
-                "authors": [author.name for author in entry.authors],
-                "published": entry.published,
-                "id": entry.id,
-                "summary": entry.summary,
-            }
-        )
-        i += 1
-        if i >= max_results:
+    url = f"{base_url}query?search_query=%28{query}%29"
+    url += f"+AND+submittedDate:[{state['start_str']}+TO+{state['end_str']}]"
+    url += "&sortBy=submittedDate&sortOrder=descending"
+
+    start = state["start"]
+    yielded = 0
+    first_page = True
+    while max_results is None or yielded < max_results:
+        if throttle is not None:
+            throttle()
+        elif not first_page:
+            time.sleep(page_wait)
+        first_page = False
+        page_url = f"{url}&start={start}&max_results={page_size}"
+        for attempt in range(1, max_retries + 1):
+            try:
+                with metrics.span("arxiv.fetch"):
+                    resp = _session.get(page_url, timeout=timeout)
+                    resp.raise_for_status()
+                with metrics.span("arxiv.parse"):
+                    total, entries = parse_feed(resp.content)
+            except FETCH_ERRORS:
+                if attempt == max_retries:
+                    raise
+            else:
+                # arxiv now and then answers a page inside the window with
+                # no entries, which is not the end of the window
+                if entries or start >= total:
+                    break
+                if attempt == max_retries:
+                    raise RuntimeError(
+                        f"arXiv returned an empty page at {start} of {total} results"
+                    )
+            time.sleep(retry_wait * attempt)
+            if throttle is not None:
+                throttle()
+
+        for entry in entries:
+            yield entry
+            yielded += 1
+            if max_results is not None and yielded >= max_results:
+                break
+
+        start += len(entries)
+        if checkpoint:
+            state["start"] = start
+            _save_checkpoint(checkpoint, state)
+        if start >= total:
             break
-    return papers
+
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+
+def _shard_windows(start, end, shard_days):
+    if not shard_days:
+        return [(start, end)]
+    windows = []
+    while start < end:
+        windows.append((start, min(start + timedelta(days=shard_days), end)))
+        start = windows[-1][1]
+    return windows
+
+
+def harvest_arxiv_shards(
+    days_ago=1,
+    since=None,
+    until=None,
+    categories=ARXIV_CATEGORIES,
+    shard_days=None,
+    max_workers=3,
+    rate=ARXIV_RATE,
+    **kwargs,
+):
+    """Harvest a window as one query per category and `shard_days` sub-window.
+
+    Shards run on `max_workers` threads that share one token bucket, so
+    together they never exceed `rate` requests per second while each shard
+    still overlaps its server latency with the others. Every shard is its
+    own sorted result set, so none is capped by the API's limit on a single
+    query. Cross-listed papers come back from several shards and are merged
+    by arXiv id, keeping the union of their categories. Returns the merged
+    papers newest first; a failing shard raises. Shards are collected in
+    memory, so there is no checkpoint to resume a failed harvest from.
+    """
+    end = until or datetime.utcnow()
+    start = since or end - timedelta(days=days_ago)
+    shards = [
+        (category, window)
+        for category in categories
+        for window in _shard_windows(start, end, shard_days)
+    ]
+    bucket = TokenBucket(rate, capacity=1)
+
+    def run(category, window):
+        return list(
+            iter_recent_arxiv_papers(
+                days_ago=days_ago,
+                since=window[0],
+                until=window[1],
+                categories=(category,),
+                throttle=bucket.acquire,
+                **kwargs,
+            )
+        )
+
+    merged = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(run, category, window) for category, window in shards]
+        # merge in shard order so the result does not depend on timing
+        for future in futures:
+            for paper in future.result():
+                arxiv_id = arxiv_id_from_url(paper["id"])
+                if arxiv_id in merged:
+                    seen = merged[arxiv_id]["categories"]
+                    seen.extend(c for c in paper["categories"] if c not in seen)
+                else:
+                    merged[arxiv_id] = paper
+    print(f"Harvested {len(merged)} arxiv papers from {len(shards)} shards.")
+    return sorted(merged.values(), key=lambda p: p["published"], reverse=True)
+
+
+def get_recent_arxiv_papers(max_results=None, days_ago=1, **kwargs):
+    # a checkpoint would make a resumed call return only the remaining pages
+    assert "checkpoint" not in kwargs, "use iter_recent_arxiv_papers to resume"
+    return list(
+        iter_recent_arxiv_papers(days_ago=days_ago, max_results=max_results, **kwargs)
+    )
@@ -0,0 +1,48 @@
+import io
+from xml.etree.ElementTree import ParseError, iterparse
+
+ATOM = "{http://www.w3.org/2005/Atom}"
+OPENSEARCH = "{http://a9.com/-/spec/opensearch/1.1/}"
+ENTRY = ATOM + "entry"
+TOTAL_RESULTS = OPENSEARCH + "totalResults"
+
+
+def _text(elem, tag):
+    child = elem.find(tag)
+    return (child.text or "").strip() if child is not None else ""
+
+
+def _record(entry):
+    return {
+        "title": _text(entry, ATOM + "title"),
+        "authors": [
+            _text(author, ATOM + "name") for author in entry.iter(ATOM + "author")
+        ],
+        "published": _text(entry, ATOM + "published"),
+        "id": _text(entry, ATOM + "id"),
+        "summary": _text(entry, ATOM + "summary"),
+        "categories": [c.get("term") for c in entry.iter(ATOM + "category")],
+    }
+
+
+def parse_feed(data):
+    """Parse an arXiv API Atom response into `(total_results, records)`.
+
+    Streams over the raw bytes with `iterparse`, copies the six fields the
+    pipeline uses out of each `<entry>` into a plain dict, in the same shape
+    as `get_recent_arxiv_papers` returns, and drops the element straight
+    after. Malformed XML raises `ParseError`.
+    """
+    total, records, root = 0, [], None
+    for event, elem in iterparse(io.BytesIO(data), events=("start", "end")):
+        if root is None:
+            root = elem
+        if event != "end":
+            continue
+        if elem.tag == ENTRY:
+            records.append(_record(elem))
+            # entries hang off the root, so clearing it frees them
+            root.clear()
+        elif elem.tag == TOTAL_RESULTS:
+            total = int(elem.text or 0)
+    return total, records
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+_MISSING = object()
+
+
+def cache_key(*parts):
+    """Content address of the JSON-serialisable `parts`."""
+    blob = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """Persistent key/value cache of JSON values in a SQLite file.
+
+    Entries expire `ttl` seconds after they are written (per entry, defaulting
+    to `default_ttl`; None never expires). Once the stored values exceed
+    `max_bytes`, the least recently read entries are evicted. The cache is
+    safe to share between the ranking worker threads.
+    """
+
+    def __init__(self, path, default_ttl=30 * 86400, max_bytes=256 * 2**20):
+        self.path = path
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+            """)
+
+    def get(self, key, default=None):
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or (row[1] is not None and row[1] < now):
+                self.misses += 1
+                return default
+            self.conn.execute(
+                "UPDATE entries SET last_access = ? WHERE key = ?", (now, key)
+            )
+            self.conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key, value, ttl=_MISSING):
+        ttl = self.default_ttl if ttl is _MISSING else ttl
+        now = time.time()
+        blob = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)",
+                (key, blob, len(blob), now + ttl if ttl is not None else None, now),
+            )
+            self._evict(now)
+            self.conn.commit()
+
+    def _evict(self, now):
+        self.conn.execute("DELETE FROM entries WHERE expires_at < ?", (now,))
+        total = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # drop least recently read entries until we are back under budget
+        excess = total - self.max_bytes
+        for key, size in self.conn.execute(
+            "SELECT key, size FROM entries ORDER BY last_access"
+        ).fetchall():
+            self.conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            excess -= size
+            if excess <= 0:
+                break
+
+    def get_or_compute(self, key, compute, ttl=_MISSING):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            # a failed computation returning None is not worth remembering
+            if value is not None:
+                self.put(key, value, ttl=ttl)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM entries")
+            self.conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
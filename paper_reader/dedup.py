@@ -0,0 +1,153 @@
+import os
+import zlib
+
+import numpy as np
+
+from .arxiv import arxiv_id_from_url, normalize_title
+
+MERSENNE = (1 << 31) - 1
+
+
+def _shingles(title, k=4):
+    text = f" {title} "
+    grams = {text[i : i + k] for i in range(max(len(text) - k + 1, 1))}
+    return np.fromiter(
+        (zlib.crc32(g.encode()) % MERSENNE for g in grams),
+        dtype=np.uint64,
+        count=len(grams),
+    )
+
+
+class DedupIndex:
+    """Duplicate detection for library titles, persisted between runs.
+
+    A candidate is a duplicate if its arXiv id, its normalised title, or a
+    MinHash near-duplicate of that title (estimated Jaccard over character
+    4-grams of at least `threshold`) is already indexed. Near-duplicates are
+    looked up through LSH band buckets, so a query touches only a handful of
+    entries however large the library grows. Entries are keyed (normally by
+    Notion page id) so that syncing the library only adds what is new.
+    """
+
+    def __init__(self, path=None, num_perm=64, bands=16, threshold=0.8):
+        assert num_perm % bands == 0, "num_perm must be a multiple of bands"
+        self.path = path
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        rng = np.random.default_rng(0x5EED)
+        self.a = rng.integers(1, MERSENNE, size=num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE, size=num_perm, dtype=np.uint64)
+
+        self.keys, self.titles, self.arxiv_ids = [], [], []
+        self.signatures = np.empty((0, num_perm), dtype=np.uint32)
+        if path and os.path.exists(path):
+            with np.load(path) as data:
+                self.keys = data["keys"].tolist()
+                self.titles = data["titles"].tolist()
+                self.arxiv_ids = data["arxiv_ids"].tolist()
+                self.signatures = data["signatures"]
+        self._pending = []
+        self._rebuild_lookups()
+
+    def _rebuild_lookups(self):
+        self.by_key = set(self.keys)
+        self.by_id = {a: i for i, a in enumerate(self.arxiv_ids) if a}
+        self.by_title = {t: i for i, t in enumerate(self.titles)}
+        self.buckets = {}
+        for i, band_keys in enumerate(self._band_keys(self.signatures)):
+            for band in band_keys:
+                self.buckets.setdefault(band, []).append(i)
+
+    def _signature(self, title):
+        shingles = _shingles(title)
+        hashed = (self.a[:, None] * shingles[None, :] + self.b[:, None]) % MERSENNE
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signatures):
+        signatures = np.atleast_2d(signatures).reshape(-1, self.bands, self.rows)
+        # one hashable key per (band, band contents)
+        return [
+            [(b, row[b].tobytes()) for b in range(self.bands)] for row in signatures
+        ]
+
+    def _signatures(self):
+        if self._pending:
+            self.signatures = np.vstack([self.signatures, *self._pending])
+            self._pending = []
+        return self.signatures
+
+    def find(self, title, arxiv_id=None):
+        """Key of the indexed entry this paper duplicates, or None."""
+        if arxiv_id:
+            i = self.by_id.get(arxiv_id_from_url(arxiv_id))
+            if i is not None:
+                return self.keys[i]
+        norm = normalize_title(title)
+        if norm in self.by_title:
+            return self.keys[self.by_title[norm]]
+
+        signature = self._signature(norm)
+        candidates = {
+            i
+            for band in self._band_keys(signature)[0]
+            for i in self.buckets.get(band, ())
+        }
+        if not candidates:
+            return None
+        candidates = np.fromiter(candidates, dtype=np.int64)
+        similarity = (self._signatures()[candidates] == signature).mean(axis=1)
+        best = int(np.argmax(similarity))
+        if similarity[best] >= self.threshold:
+            return self.keys[candidates[best]]
+        return None
+
+    def add(self, key, title, arxiv_id=None):
+        if key in self.by_key:
+            return
+        i = len(self.keys)
+        norm = normalize_title(title)
+        arxiv_id = arxiv_id_from_url(arxiv_id) if arxiv_id else ""
+        signature = self._signature(norm)
+        self.keys.append(key)
+        self.titles.append(norm)
+        self.arxiv_ids.append(arxiv_id)
+        self._pending.append(signature[None, :])
+        self.by_key.add(key)
+        self.by_title.setdefault(norm, i)
+        if arxiv_id:
+            self.by_id.setdefault(arxiv_id, i)
+        for band in self._band_keys(signature)[0]:
+            self.buckets.setdefault(band, []).append(i)
+
+    def retain(self, keys):
+        """Drop the entries whose key is not in `keys`, e.g. deleted pages."""
+        keep = [i for i, key in enumerate(self.keys) if key in keys]
+        if len(keep) == len(self.keys):
+            return 0
+        dropped = len(self.keys) - len(keep)
+        self.signatures = self._signatures()[keep]
+        self.keys = [self.keys[i] for i in keep]
+        self.titles = [self.titles[i] for i in keep]
+        self.arxiv_ids = [self.arxiv_ids[i] for i in keep]
+        self._rebuild_lookups()
+        return dropped
+
+    def __contains__(self, key):
+        return key in self.by_key
+
+    def __len__(self):
+        return len(self.keys)
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp.npz"
+        np.savez_compressed(
+            tmp,
+            keys=np.array(self.keys, dtype=str),
+            titles=np.array(self.titles, dtype=str),
+            arxiv_ids=np.array(self.arxiv_ids, dtype=str),
+            signatures=self._signatures(),
+        )
+        os.replace(tmp, self.path)
@@ -0,0 +1,132 @@
+import json
+import os
+import pickle
+from datetime import datetime, timezone
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class PaperHistory:
+    """Append-only, git-friendly record of recommended papers and profiles.
+
+    Layout under `root`:
+        papers/YYYY-MM.jsonl   one JSON record per recommended paper per run
+        preferences.jsonl      one record per preference profile version
+        index.json             per-segment date range and record counts
+
+    Records are only ever appended, so daily commits diff as added lines.
+    Reads stream line by line, and date-range reads use the index to skip
+    whole monthly segments.
+    """
+
+    def __init__(self, root="history"):
+        self.root = root
+        self.papers_dir = os.path.join(root, "papers")
+        self.index_file = os.path.join(root, "index.json")
+        self.preference_file = os.path.join(root, "preferences.jsonl")
+        os.makedirs(self.papers_dir, exist_ok=True)
+        try:
+            with open(self.index_file) as f:
+                self.index = json.load(f)
+        except FileNotFoundError:
+            self.index = {"segments": {}, "latest_run": None}
+
+    def _save_index(self):
+        tmp = self.index_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.index, f, indent=1, sort_keys=True)
+            f.write("\n")
+        os.replace(tmp, self.index_file)
+
+    # --- papers ---
+    def append_run(self, papers, run=None):
+        """Append one record per paper, all stamped with the same run time."""
+        run = run or _now()
+        date = run[:10]
+        segment = f"{run[:7]}.jsonl"
+        records = [
+            {
+                "run": run,
+                "date": date,
+                "arxiv_id": paper.arxiv_id,
+                "name": paper.name,
+                "authors": paper.authors,
+                "summary": paper.summary,
+            }
+            for paper in papers
+        ]
+        if not records:
+            return run
+        with open(os.path.join(self.papers_dir, segment), "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+        meta = self.index["segments"].setdefault(
+            segment, {"first": date, "last": date, "records": 0, "runs": 0}
+        )
+        meta["first"] = min(meta["first"], date)
+        meta["last"] = max(meta["last"], date)
+        meta["records"] += len(records)
+        meta["runs"] += 1
+        self.index["latest_run"] = run
+        self._save_index()
+        return run
+
+    def iter_papers(self, start=None, end=None):
+        """Stream paper records with `start <= date <= end` (YYYY-MM-DD strings)."""
+        for segment in sorted(self.index["segments"]):
+            meta = self.index["segments"][segment]
+            if (start and meta["last"] < start) or (end and meta["first"] > end):
+                continue
+            with open(os.path.join(self.papers_dir, segment), encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if start and record["date"] < start:
+                        continue
+                    if end and record["date"] > end:
+                        break
+                    yield record
+
+    def latest_run(self):
+        run = self.index["latest_run"]
+        if run is None:
+            return []
+        return [r for r in self.iter_papers(start=run[:10]) if r["run"] == run]
+
+    def __len__(self):
+        return sum(meta["records"] for meta in self.index["segments"].values())
+
+    # --- preferences ---
+    def append_preference(self, profile, run=None):
+        if profile == self.latest_preference():
+            return False
+        with open(self.preference_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"run": run or _now(), "profile": profile}) + "\n")
+        return True
+
+    def latest_preference(self):
+        profile = None
+        if os.path.exists(self.preference_file):
+            with open(self.preference_file, encoding="utf-8") as f:
+                for line in f:
+                    profile = json.loads(line)["profile"]
+        return profile
+
+
+def migrate_pickles(
+    history, new_paper_file="new_paper.pkl", preference_file="preference.pkl"
+):
+    # one-off import of the pickles written by earlier versions
+    if os.path.exists(preference_file) and history.latest_preference() is None:
+        with open(preference_file, "rb") as f:
+            history.append_preference(pickle.load(f))
+        print(f"Imported {preference_file} into {history.root}")
+    if os.path.exists(new_paper_file) and not len(history):
+        run = datetime.fromtimestamp(
+            os.path.getmtime(new_paper_file), timezone.utc
+        ).strftime("%Y-%m-%dT%H:%M:%SZ")
+        with open(new_paper_file, "rb") as f:
+            history.append_run(pickle.load(f), run=run)
+        print(f"Imported {new_paper_file} into {history.root}")
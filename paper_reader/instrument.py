@@ -0,0 +1,138 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+
+
+class RunMetrics:
+    """Thread-safe counters for one pipeline run.
+
+    Collects wall-time spans per stage, request counts, latencies and bytes
+    per external service, and OpenAI token usage per model, and renders
+    them as one JSON run report.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started = time.perf_counter()
+            self.started_at = datetime.now(timezone.utc).isoformat()
+            self.spans = {}
+            self.services = {}
+            self.tokens = {}
+            self.counters = {}
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                s = self.spans.setdefault(
+                    name, {"count": 0, "seconds": 0.0, "max": 0.0}
+                )
+                s["count"] += 1
+                s["seconds"] += elapsed
+                s["max"] = max(s["max"], elapsed)
+
+    def timed(self, name):
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def record_request(self, service, seconds, nbytes=0, status=None):
+        with self._lock:
+            s = self.services.setdefault(
+                service,
+                {"requests": 0, "errors": 0, "seconds": 0.0, "max": 0.0, "bytes": 0},
+            )
+            s["requests"] += 1
+            s["seconds"] += seconds
+            s["max"] = max(s["max"], seconds)
+            s["bytes"] += nbytes
+            if status is not None and status >= 400:
+                s["errors"] += 1
+
+    def record_tokens(self, model, usage):
+        if usage is None:
+            return
+        with self._lock:
+            t = self.tokens.setdefault(
+                model, {"calls": 0, "input_tokens": 0, "output_tokens": 0}
+            )
+            t["calls"] += 1
+            t["input_tokens"] += getattr(usage, "input_tokens", 0) or 0
+            t["output_tokens"] += getattr(usage, "output_tokens", 0) or 0
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def report(self):
+        with self._lock:
+            services = {
+                name: {**s, "mean": s["seconds"] / s["requests"]}
+                for name, s in self.services.items()
+            }
+            return {
+                "started_at": self.started_at,
+                "wall_seconds": time.perf_counter() - self.started,
+                "spans": dict(self.spans),
+                "services": services,
+                "tokens": dict(self.tokens),
+                "counters": dict(self.counters),
+            }
+
+    def write_report(self, path, **extra):
+        report = {**self.report(), **extra}
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        return report
+
+
+# one shared instance for the whole process
+metrics = RunMetrics()
+
+
+def requests_hook(service):
+    """`requests` response hook counting calls, latency and bytes."""
+
+    def hook(response, *args, **kwargs):
+        metrics.record_request(
+            service,
+            response.elapsed.total_seconds(),
+            len(response.content),
+            response.status_code,
+        )
+
+    return hook
+
+
+def httpx_hooks(service):
+    """`event_hooks` for an httpx client, as used by the Notion and OpenAI SDKs."""
+
+    def on_request(request):
+        request.extensions["paper_reader_start"] = time.perf_counter()
+
+    def on_response(response):
+        response.read()
+        start = response.request.extensions.get("paper_reader_start")
+        elapsed = time.perf_counter() - start if start else 0.0
+        metrics.record_request(
+            service, elapsed, len(response.content), response.status_code
+        )
+
+    return {"request": [on_request], "response": [on_response]}
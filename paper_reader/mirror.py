@@ -0,0 +1,143 @@
+import json
+import sqlite3
+import threading
+import time
+from functools import partial
+
+from notion_client.helpers import iterate_paginated_api
+
+
+class NotionMirror:
+    """Local copy of a Notion database's pages, kept fresh incrementally.
+
+    The first `sync` follows `next_cursor` through the whole database. Later
+    syncs only ask for pages whose `last_edited_time` is at or past the newest
+    one seen by a previous sync. Pages passed to `upsert` do not move that
+    watermark, since they are not the whole database. Notion rounds the
+    timestamp to the minute, so the boundary is inclusive. Incremental syncs
+    cannot see archived or deleted pages, so `sync(full=True)` rebuilds the
+    mirror from scratch, as does any sync once the last full read is more
+    than `full_sync_days` old. With `path=None` the mirror lives in memory
+    and every run does a full paginated read. The mirror can be shared
+    between threads.
+    """
+
+    def __init__(self, notion, database_id, path=None, call=None, full_sync_days=None):
+        self.notion = notion
+        self.database_id = database_id
+        self.full_sync_days = full_sync_days
+        # e.g. NotionWriter.call, to put reads under the shared rate limit
+        self.query = self.notion.databases.query
+        if call is not None:
+            self.query = partial(call, self.query)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path or ":memory:", check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                id TEXT PRIMARY KEY,
+                database_id TEXT NOT NULL,
+                last_edited_time TEXT NOT NULL,
+                page TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS pages_db_edited
+                ON pages (database_id, last_edited_time);
+            CREATE TABLE IF NOT EXISTS meta (
+                database_id TEXT PRIMARY KEY,
+                watermark TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS full_syncs (
+                database_id TEXT PRIMARY KEY,
+                synced_at REAL NOT NULL
+            );
+            """)
+
+    def watermark(self):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT watermark FROM meta WHERE database_id = ?", (self.database_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def full_sync_due(self):
+        if self.full_sync_days is None:
+            return False
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT synced_at FROM full_syncs WHERE database_id = ?",
+                (self.database_id,),
+            ).fetchone()
+        return row is None or time.time() - row[0] > self.full_sync_days * 86400
+
+    def sync(self, full=False):
+        full = full or self.full_sync_due()
+        query = {"database_id": self.database_id}
+        watermark = None if full else self.watermark()
+        if watermark:
+            query["filter"] = {
+                "timestamp": "last_edited_time",
+                "last_edited_time": {"on_or_after": watermark},
+            }
+
+        pages = list(iterate_paginated_api(self.query, **query))
+        with self._lock, self.conn:
+            if full:
+                self.conn.execute(
+                    "DELETE FROM pages WHERE database_id = ?", (self.database_id,)
+                )
+                self.conn.execute(
+                    "DELETE FROM meta WHERE database_id = ?", (self.database_id,)
+                )
+            self._upsert(pages)
+            if pages:
+                self._set_watermark(max(p["last_edited_time"] for p in pages))
+            if watermark is None:
+                # a read of the whole database, the next one is due from now
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO full_syncs VALUES (?, ?)",
+                    (self.database_id, time.time()),
+                )
+        print(
+            f"Synced {len(pages)} notion pages"
+            + (f" edited since {watermark}." if watermark else ".")
+        )
+        return len(pages)
+
+    def upsert(self, *pages):
+        # keep the mirror in step with pages fetched or written elsewhere
+        with self._lock, self.conn:
+            self._upsert(pages)
+
+    def _set_watermark(self, edited):
+        self.conn.execute(
+            "INSERT INTO meta (database_id, watermark) VALUES (?, ?) "
+            "ON CONFLICT(database_id) DO UPDATE SET watermark = excluded.watermark "
+            "WHERE excluded.watermark > meta.watermark",
+            (self.database_id, edited),
+        )
+
+    def _upsert(self, pages):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?)",
+            [
+                (p["id"], self.database_id, p["last_edited_time"], json.dumps(p))
+                for p in pages
+                if not p.get("archived") and not p.get("in_trash")
+            ],
+        )
+        gone = [(p["id"],) for p in pages if p.get("archived") or p.get("in_trash")]
+        if gone:
+            self.conn.executemany("DELETE FROM pages WHERE id = ?", gone)
+
+    def pages(self):
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT page FROM pages WHERE database_id = ? ORDER BY last_edited_time DESC",
+                (self.database_id,),
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM pages WHERE database_id = ?", (self.database_id,)
+            ).fetchone()[0]
@@ -1,219 +1,658 @@
 import os
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-
+import httpx
 from notion_client import Client
-from openai import OpenAI
+from notion_client.helpers import iterate_paginated_api
+from openai import DefaultHttpxClient, OpenAI
+from openai.types.responses import Response
 from .arxiv import (
-    search_arxiv_abstract,
-    search_arxiv_paper_info,
-    get_recent_arxiv_papers,
+    ARXIV_CATEGORIES,
+    arxiv_id_from_url,
+    search_arxiv_batch,
+    iter_recent_arxiv_papers,
 )
-from .paper import Paper, ListOfPapers
+from .cache import cache_key
+from .dedup import DedupIndex
+from .instrument import httpx_hooks, metrics
+from .mirror import NotionMirror
+from .paper import Paper, PaperDigests, RankedPapers
+from .prefilter import prefilter_papers
+from .prompt import EXAMPLE_TOKENS, pack_papers, select_examples, truncate_to_tokens
+from .table import PaperTable
+from .writer import NotionWriter
+
 
 class NotionDBManager:
-    def __init__(self, database_id, gpt_model="gpt-4.1"):
+    def __init__(
+        self,
+        database_id,
+        gpt_model="gpt-4.1",
+        paper_store=None,
+        response_cache=None,
+        mirror_path=None,
+        seen_set=None,
+        dedup_path=None,
+        notion=None,
+        oai=None,
+        harvest_kwargs=None,
+        writer=None,
+        rank_prompt_tokens=16000,
+        preference_prompt_tokens=24000,
+        arxiv_cache=None,
+        full_sync=False,
+        full_sync_days=None,
+    ):
         self.database_id = database_id
-        self.notion = Client(auth=os.environ["NOTION_API_TOKEN"])
-        self.oai = OpenAI()
+        self.paper_store = paper_store
+        self.seen_set = seen_set
+        self.response_cache = response_cache
+        self.arxiv_cache = arxiv_cache
+        # clients can be passed in, e.g. pointed at local fakes for benchmarks
+        self.notion = notion or Client(
+            auth=os.environ["NOTION_API_TOKEN"],
+            client=httpx.Client(event_hooks=httpx_hooks("notion")),
+        )
+        self.oai = oai or OpenAI(
+            http_client=DefaultHttpxClient(event_hooks=httpx_hooks("openai"))
+        )
+        self.harvest_kwargs = harvest_kwargs or {}
         self.gpt_model = gpt_model
-        self._read_paper_db(database_id)
-        self.existing_notion_papers = self._get_all_db_papers()
+        # token budgets of the paper listings in the ranking and profile prompts
+        self.rank_prompt_tokens = rank_prompt_tokens
+        self.preference_prompt_tokens = preference_prompt_tokens
+        # profiles on one integration share a writer, and so its rate limit
+        self.writer = writer or NotionWriter()
+        self.mirror = NotionMirror(
+            self.notion,
+            database_id,
+            path=mirror_path,
+            call=self.writer.call,
+            full_sync_days=full_sync_days,
+        )
+        self.full_sync = full_sync
+        # the database is only read (and synced) on first use
+        self._my_db = None
+        self._existing_notion_papers = None
+        self._rating_buckets = None
+        self._unranked_ids = set()
+        self.dedup_path = dedup_path
+        self._dedup_index = None
 
-    def add_papers(self, user_preference, past_days=7, max_papers=20):
+    @property
+    def my_db(self):
+        if self._my_db is None:
+            self._read_paper_db(self.database_id)
+        return self._my_db
+
+    @property
+    def existing_notion_papers(self):
+        if self._existing_notion_papers is None:
+            self._existing_notion_papers = self._get_all_db_papers()
+        return self._existing_notion_papers
+
+    @property
+    def dedup_index(self):
+        if self._dedup_index is None:
+            self._dedup_index = DedupIndex(self.dedup_path)
+            for page in self.my_db["results"]:
+                self._index_page(page)
+            # pages deleted from notion leave the mirror on a full sync
+            self._dedup_index.retain({page["id"] for page in self.my_db["results"]})
+            self._dedup_index.save()
+        return self._dedup_index
+
+    def add_papers(self, user_preference, past_days=7, **kwargs):
         # add top ranked papers from arxiv to the notion database
         # the ranking is decided by gpt
-        papers = get_recent_arxiv_papers(days_ago=past_days)
-        sys_prompt = (
-            "The user provided the following research interest description: "
-            + user_preference
+        papers = self.harvest(past_days)
+        return self.add_harvested_papers(
+            user_preference, papers, past_days=past_days, **kwargs
         )
-        sys_prompt += f"Please return a list of papers (max {max_papers}) that are most relevant to the research interests based on the following papers:\n"
 
+    @metrics.timed("arxiv.harvest")
+    def harvest(self, past_days=7):
+        if self.paper_store is not None:
+            # only the part of the window newer than the last sync hits arxiv
+            self.paper_store.sync(days_ago=past_days, **self.harvest_kwargs)
+            papers = self.paper_store.window(
+                days_ago=past_days,
+                categories=self.harvest_kwargs.get("categories", ARXIV_CATEGORIES),
+            )
+        else:
+            papers = PaperTable.from_records(
+                iter_recent_arxiv_papers(days_ago=past_days, **self.harvest_kwargs)
+            )
+        metrics.count("arxiv.candidates", len(papers))
+        return papers
+
+    def add_harvested_papers(
+        self,
+        user_preference,
+        papers,
+        past_days=7,
+        max_papers=20,
+        prefilter_k=150,
+        chunk_size=50,
+        max_workers=4,
+        rerank_seen=False,
+        term_counts=None,
+    ):
         print(
             f"Found {len(papers)} relevant papers from arxiv, from the past {past_days} days, filtering to {max_papers} most relevant papers."
         )
+        if self.seen_set is not None and not rerank_seen:
+            # papers ranked on an earlier run are not sent to the llm again
+            papers = self.seen_set.filter_new(papers)
+            print(f"{len(papers)} of them have not been ranked before.")
+        if not papers:
+            return []
+        if prefilter_k and len(papers) > prefilter_k:
+            # cheap local scoring so only the top candidates reach the llm
+            liked = self._get_rated_abstracts([4, 5])
+            disliked = self._get_rated_abstracts([1, 2])
+            with metrics.span("prefilter"):
+                papers = prefilter_papers(
+                    papers,
+                    user_preference,
+                    liked=liked,
+                    disliked=disliked,
+                    k=prefilter_k,
+                    term_counts=term_counts,
+                )
+            print(f"Prefiltered to {len(papers)} candidates before ranking.")
 
-        prompt = "\n".join(
-            [
-                f"{paper['title']} by {paper['authors']} with the following summary {paper['summary']}, it has the following arxiv id {paper['id']}"
-                for paper in papers
-            ]
-        )
-
-        plain_response = self._gpt_query(sys_prompt + prompt)
-        sys_prompt = "Extract the paper information, keep the full abstract/summary."
-        paper_list = self._gpt_query_formatted(
-            sys_prompt=sys_prompt, prompt=plain_response, response_format=ListOfPapers
-        )
+        self._unranked_ids = set()
+        metrics.count("llm.candidates", len(papers))
+        with metrics.span("rank"):
+            ranked = self._rank_papers(
+                user_preference,
+                papers,
+                max_papers,
+                chunk_size=chunk_size,
+                max_workers=max_workers,
+            )
+        paper_list = PaperTable.from_records(ranked).to_papers()
 
-        written = 0
-        new_papers = []
-        for p in paper_list.papers:
-            # check whether the paper already exists in the database
-            if not p.name in self.existing_notion_papers:
-                self.write_paper_to_notion(p)
-                new_papers.append(p)
-                written += 1
-        print(f"Added {written} papers to the notion database.")
+        # check whether the paper already exists in the database, by arxiv id,
+        # normalised title or a near-duplicate title
+        with metrics.span("dedup"):
+            candidates = self._drop_duplicates(paper_list)
+        reports = self.write_papers_to_notion(candidates)
+        self.dedup_index.save()
+        new_papers = [p for p, r in zip(candidates, reports) if r["ok"]]
+        print(f"Added {len(new_papers)} papers to the notion database.")
+        if self.seen_set is not None:
+            # selected papers that failed to write are ranked again next run
+            failed = {p.arxiv_id for p, r in zip(candidates, reports) if not r["ok"]}
+            self.seen_set.add(
+                [
+                    i
+                    for i in papers.ids
+                    if i not in self._unranked_ids
+                    and arxiv_id_from_url(i) not in failed
+                ],
+                selected_ids=[
+                    p["id"] for p in ranked if arxiv_id_from_url(p["id"]) not in failed
+                ],
+            )
+            self.seen_set.save()
         return new_papers
 
+    def _drop_duplicates(self, paper_list):
+        candidates, batch = [], DedupIndex()
+        for p in paper_list:
+            duplicate = self.dedup_index.find(p.name, p.arxiv_id) or batch.find(
+                p.name, p.arxiv_id
+            )
+            if duplicate:
+                print(f"Skipping {p.name}, already in the database as {duplicate}.")
+                continue
+            batch.add(p.name, p.name, p.arxiv_id)
+            candidates.append(p)
+        return candidates
+
     def write_paper_to_notion(self, paper):
         # write a paper to the notion database
-        # paper is a dict with keys: name, arxiv_id, summary
-        print(paper.arxiv_id, paper.name, paper.summary)
-        url = f"https://arxiv.org/abs/{paper.arxiv_id}" if paper.arxiv_id else None
-        self.notion.pages.create(
-            parent={"database_id": self.database_id},
-            properties={
+        return self.write_papers_to_notion([paper])[0]
+
+    def write_papers_to_notion(self, papers):
+        jobs = []
+        for paper in papers:
+            print(paper.arxiv_id, paper.name, paper.summary)
+            url = f"https://arxiv.org/abs/{paper.arxiv_id}" if paper.arxiv_id else None
+            properties = {
                 "Name": {"title": [{"text": {"content": paper.name}}]},
                 "URL": {"url": url},
                 "Abstract": {
                     "type": "rich_text",
                     "rich_text": [{"type": "text", "text": {"content": paper.summary}}],
                 },
-            },
-        )
+            }
+            jobs.append(
+                (
+                    paper.name,
+                    self.notion.pages.create,
+                    {
+                        "parent": {"database_id": self.database_id},
+                        "properties": properties,
+                    },
+                )
+            )
+        # a retried create can leave a duplicate page behind
+        return self._write(jobs, idempotent=False)
 
+    @metrics.timed("preference.full")
     def get_user_preference(self, prefix):
-        positive_papers, negative_papers = {}, {}
-        positive_papers = self._get_paper_by_ratings([4, 5])
-        negative_papers = self._get_paper_by_ratings([1, 2])
-        positive_papers = "\n".join(
-            [f"{name}: {paper['abstract']}" for name, paper in positive_papers.items()]
-        )
-        negative_papers = "\n".join(
-            [f"{name}: {paper['abstract']}" for name, paper in negative_papers.items()]
-        )
+        liked = self._get_paper_by_ratings([4, 5])
+        disliked = self._get_paper_by_ratings([1, 2])
+        # the budget is split by count, and the liked papers also get
+        # whatever the disliked ones leave
+        budget = self.preference_prompt_tokens
+        share = budget * len(liked) // max(len(liked) + len(disliked), 1)
+        negative = select_examples(disliked, self.gpt_model, budget - share)
+        positive = select_examples(liked, self.gpt_model, budget - negative.used)
+        positive.report("liked")
+        negative.report("disliked")
+        positive_papers, negative_papers = positive.text(), negative.text()
         prompt = f"This is my general research interest: {prefix}\n\n"
         prompt += f"This is a list of papers I like (names and abstracts): {positive_papers}\n"
         prompt += f"This is a list of papers I do not like (names and abstracts): {negative_papers}\n"
         prompt += "(1) Please return a description of user research interests. (2) Add also a list of tags and keywords that best match the research interests based on the above papers the user liked and disliked.\n"
         return self._gpt_query(prompt)
 
+    def get_rated_papers(self):
+        # every rated paper keyed by page id
+        return {
+            paper["id"]: {"name": name, **paper}
+            for bucket in self._get_rating_buckets().values()
+            for name, paper in bucket.items()
+        }
+
+    @metrics.timed("preference.digest")
+    def digest_papers(self, papers, chunk_size=30):
+        # short per-paper summaries, used to update the profile incrementally
+        # instead of resending full abstracts
+        sys_prompt = (
+            "For each paper, write a one sentence digest of its topic and method "
+            "followed by up to five keywords. Return the page id exactly as given."
+        )
+        items = list(papers.items())
+        digests = {}
+        for i in range(0, len(items), chunk_size):
+            lines = []
+            for page_id, paper in items[i : i + chunk_size]:
+                abstract, _ = truncate_to_tokens(
+                    paper["abstract"], EXAMPLE_TOKENS, self.gpt_model
+                )
+                lines.append(f"[{page_id}] {paper['name']}: {abstract}")
+            prompt = "\n".join(lines)
+            result = self._gpt_query_formatted(
+                sys_prompt=sys_prompt, prompt=prompt, response_format=PaperDigests
+            )
+            digests.update({d.page_id: d.digest for d in result.digests})
+        return digests
+
+    @metrics.timed("preference.update")
+    def update_user_preference(self, prefix, profile, liked, disliked, unrated):
+        def listing(digests):
+            return "\n".join(f"- {digest}" for digest in digests) or "(none)"
+
+        prompt = f"This is my general research interest: {prefix}\n\n"
+        prompt += f"This is my current research interest profile:\n{profile}\n\n"
+        prompt += (
+            f"Since it was written I rated these papers highly:\n{listing(liked)}\n"
+        )
+        prompt += f"I rated these papers poorly:\n{listing(disliked)}\n"
+        prompt += f"These papers are no longer rated:\n{listing(unrated)}\n"
+        prompt += "Update the profile to reflect these changes, keeping its structure: (1) a description of user research interests, (2) a list of tags and keywords that best match the research interests.\n"
+        return self._gpt_query(prompt)
+
     # --- DB operations ---
     def fill_empty_paper_abstract(self):
         # Fill empty paper abstracts with arxiv abstracts
+        missing = {}
         for paper in self.my_db["results"]:
             if not paper["properties"]["Abstract"]["rich_text"]:
                 paper_title = paper["properties"]["Name"]["title"][0]["text"]["content"]
-                print("Searching arxiv for abstract of paper:", paper_title)
-                abstract = search_arxiv_abstract(paper_title, return_all=False)
-                if abstract:
-                    self.notion.pages.update(
-                        page_id=paper["id"],
-                        properties={
-                            "Abstract": {"rich_text": [{"text": {"content": abstract}}]}
+                missing[paper["id"]] = paper_title
+        print(f"Searching arxiv for abstracts of {len(missing)} papers.")
+        found = search_arxiv_batch(titles=missing.values(), cache=self.arxiv_cache)
+
+        jobs = []
+        for page_id, paper_title in missing.items():
+            info = found.get(paper_title)
+            if info and info["abstract"]:
+                jobs.append(
+                    (
+                        paper_title,
+                        self.notion.pages.update,
+                        {
+                            "page_id": page_id,
+                            "properties": {
+                                "Abstract": {
+                                    "rich_text": [
+                                        {"text": {"content": info["abstract"]}}
+                                    ]
+                                }
+                            },
                         },
                     )
-                    print("Updated abstract for paper:", paper_title)
-                else:
-                    print("No abstract found for paper:", paper_title)
+                )
+            else:
+                print("No abstract found for paper:", paper_title)
+
+        reports = self._write(jobs)
+        updated, failed = NotionWriter.summarize(reports)
+        print(f"Updated abstracts for {updated} papers ({failed} failed).")
+        return reports
 
     def fill_missing_url_and_abstract(self):
         """Scan all existing entries and add missing URL and abstract information"""
         print("Scanning database for missing URL and abstract information...")
-        updated_count = 0
-
+        missing = []
         for paper in self.my_db["results"]:
             paper_name = paper["properties"]["Name"]["title"][0]["text"]["content"]
-            paper_id = paper["id"]
+            url = paper["properties"]["URL"]["url"]
+            abstract_missing = not paper["properties"]["Abstract"]["rich_text"]
+            if not url or abstract_missing:
+                # papers that already link to arxiv can be looked up by id
+                arxiv_id = (
+                    arxiv_id_from_url(url) if url and "arxiv.org/abs/" in url else None
+                )
+                missing.append(
+                    (paper["id"], paper_name, url, abstract_missing, arxiv_id)
+                )
 
-            # Check if URL is missing
-            url_missing = not paper["properties"]["URL"]["url"]
+        print(f"Searching arxiv for {len(missing)} papers with missing information.")
+        found = search_arxiv_batch(
+            titles=[name for _, name, _, _, arxiv_id in missing if not arxiv_id],
+            ids=[arxiv_id for *_, arxiv_id in missing if arxiv_id],
+            cache=self.arxiv_cache,
+        )
 
-            # Check if Abstract is missing
-            abstract_missing = not paper["properties"]["Abstract"]["rich_text"]
+        jobs = []
+        for paper_id, paper_name, url, abstract_missing, arxiv_id in missing:
+            paper_info = found.get(arxiv_id or paper_name)
+
+            # Update the paper if we found missing information
+            update_properties = {}
+            if paper_info:
+                if abstract_missing and paper_info.get("abstract"):
+                    update_properties["Abstract"] = {
+                        "rich_text": [{"text": {"content": paper_info["abstract"]}}]
+                    }
+                    print(f"Found abstract for: {paper_name}")
 
-            if url_missing or abstract_missing:
-                print(f"Processing paper: {paper_name}")
+                if not url and paper_info.get("url"):
+                    update_properties["URL"] = {"url": paper_info["url"]}
+                    print(f"Found URL for: {paper_name}")
 
-                # Try to find paper on arxiv by title
-                print(f"Searching arxiv for: {paper_name}")
+            if update_properties:
+                jobs.append(
+                    (
+                        paper_name,
+                        self.notion.pages.update,
+                        {"page_id": paper_id, "properties": update_properties},
+                    )
+                )
+            else:
+                print(f"No additional information found for: {paper_name}")
 
-                # Get paper info from arxiv
-                paper_info = search_arxiv_paper_info(paper_name)
+        reports = self._write(jobs)
+        updated, failed = NotionWriter.summarize(reports)
+        print(f"Updated {updated} papers with missing information ({failed} failed).")
+        return reports
 
-                # Update the paper if we found missing information
-                update_properties = {}
+    @metrics.timed("notion.write")
+    def _write(self, jobs, idempotent=True):
+        # all page writes go through the shared rate-limited writer
+        reports = self.writer.run(jobs, idempotent=idempotent)
+        for report in reports:
+            if report["ok"]:
+                self._remember_page(report["result"])
+        return reports
 
-                if paper_info:
-                    if abstract_missing and paper_info.get("abstract"):
-                        update_properties["Abstract"] = {
-                            "rich_text": [{"text": {"content": paper_info["abstract"]}}]
-                        }
-                        print(f"Found abstract for: {paper_name}")
+    # --- ranking ---
+    def _rank_papers(
+        self, user_preference, papers, max_papers, chunk_size=50, max_workers=4
+    ):
+        # map: rank balanced chunks concurrently, keeping max_papers per chunk
+        # reduce: rank the merged winners again, in one call once they fit
+        chunk_size = max(chunk_size, 2 * max_papers)
+        first_round = True
+        while True:
+            if not first_round and self._fits_one_prompt(papers):
+                n_chunks = 1
+            else:
+                n_chunks = -(-len(papers) // chunk_size)
+            size = -(-len(papers) // n_chunks)
+            chunks = [papers[i : i + size] for i in range(0, len(papers), size)]
+            if len(chunks) > 1:
+                print(f"Ranking {len(papers)} candidates in {len(chunks)} chunks.")
+            winners, failed = self._rank_round(
+                user_preference, chunks, max_papers, max_workers
+            )
+            if first_round:
+                # candidates of a failed chunk are left for a later run
+                self._unranked_ids.update(p["id"] for chunk in failed for p in chunk)
+            else:
+                # winners of a failed chunk keep their previous round's score
+                winners.extend(p for chunk in failed for p in chunk)
+            winners.sort(key=lambda p: -p["score"])
+            if len(chunks) == 1 or len(winners) <= max_papers:
+                return winners[:max_papers]
+            if len(winners) >= len(papers):
+                print("Ranking made no progress, keeping the best scored papers.")
+                return winners[:max_papers]
+            papers, first_round = winners, False
 
-                    if url_missing and paper_info.get("url"):
-                        update_properties["URL"] = {"url": paper_info["url"]}
-                        print(f"Found URL for: {paper_name}")
+    def _rank_round(self, user_preference, chunks, max_papers, max_workers):
+        # every chunk, a single one included, fails the same way: it is
+        # returned in `failed` instead of raising
+        winners, failed = {}, []
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                pool.submit(
+                    self._rank_chunk_with_retries, user_preference, chunk, max_papers
+                ): chunk
+                for chunk in chunks
+            }
+            for future in as_completed(futures):
+                try:
+                    for paper in future.result():
+                        winners.setdefault(paper["id"], paper)
+                except Exception as e:
+                    print(f"Dropping a ranking chunk after retries: {e}")
+                    failed.append(futures[future])
+        return list(winners.values()), failed
 
-                if update_properties:
-                    self.notion.pages.update(
-                        page_id=paper_id, properties=update_properties
-                    )
-                    updated_count += 1
-                    print(f"Updated paper: {paper_name}")
-                else:
-                    print(f"No additional information found for: {paper_name}")
+    def _fits_one_prompt(self, papers):
+        # whole, untruncated summaries within the ranking prompt budget
+        by_id = {arxiv_id_from_url(paper["id"]): paper for paper in papers}
+        packer, _ = pack_papers(by_id, self.gpt_model, self.rank_prompt_tokens)
+        return not packer.truncated and not packer.dropped
 
-        print(f"Updated {updated_count} papers with missing information.")
+    def _rank_chunk_with_retries(
+        self, user_preference, papers, max_papers, max_retries=3, retry_wait=2
+    ):
+        for attempt in range(1, max_retries + 1):
+            try:
+                return self._rank_chunk(user_preference, papers, max_papers)
+            except Exception:
+                if attempt == max_retries:
+                    raise
+                time.sleep(retry_wait * attempt)
+
+    @metrics.timed("llm.rank_chunk")
+    def _rank_chunk(self, user_preference, papers, max_papers):
+        # the model only returns ids and scores, the records are rebuilt locally
+        by_id = {arxiv_id_from_url(paper["id"]): paper for paper in papers}
+        sys_prompt = (
+            "The user provided the following research interest description: "
+            + user_preference
+        )
+        sys_prompt += (
+            f"\nFrom the papers below, select at most {max_papers} that are most relevant "
+            "to the research interests. For each selected paper return its arxiv id "
+            "exactly as given, a relevance score from 1 to 10 and a one sentence rationale."
+        )
+        packer, packed = pack_papers(by_id, self.gpt_model, self.rank_prompt_tokens)
+        packer.report("candidate", verbose=bool(packer.dropped))
+        if packer.dropped:
+            # left for a later run instead of being marked as seen
+            self._unranked_ids.update(
+                paper["id"]
+                for arxiv_id, paper in by_id.items()
+                if arxiv_id not in packed
+            )
+            by_id = {arxiv_id: by_id[arxiv_id] for arxiv_id in packed}
+        prompt = packer.text()
+        ranked = self._gpt_query_formatted(
+            sys_prompt=sys_prompt, prompt=prompt, response_format=RankedPapers
+        )
+
+        selected = []
+        for r in sorted(ranked.papers, key=lambda r: -r.score):
+            arxiv_id = arxiv_id_from_url(r.arxiv_id.strip("[] "))
+            if arxiv_id in by_id:
+                selected.append({**by_id.pop(arxiv_id), "score": r.score})
+        return selected[:max_papers]
 
     # --- helper functions ---
 
+    def _cached(self, parts, compute):
+        # responses are keyed on the model and everything sent to it
+        if self.response_cache is None:
+            return compute()
+        key = cache_key(self.gpt_model, *parts)
+        return self.response_cache.get_or_compute(key, compute)
+
     def _gpt_query_formatted(self, sys_prompt, prompt, response_format=None):
-        response = self.oai.responses.parse(
-            model=self.gpt_model,
-            input=[
-                {"role": "system", "content": sys_prompt},
-                {"role": "user", "content": prompt},
-            ],
-            text_format=response_format,
-        )
-        return response.output_parsed
+        def compute():
+            response = self.oai.responses.parse(
+                model=self.gpt_model,
+                input=[
+                    {"role": "system", "content": sys_prompt},
+                    {"role": "user", "content": prompt},
+                ],
+                text_format=response_format,
+            )
+            metrics.record_tokens(self.gpt_model, response.usage)
+            # raising keeps a refusal or truncated answer out of the cache,
+            # so a retry asks the model again
+            if response.output_parsed is None:
+                raise ValueError("The model returned no parsed output.")
+            return response.output_parsed.model_dump()
+
+        schema = response_format.model_json_schema() if response_format else None
+        parsed = self._cached(("parse", sys_prompt, prompt, schema), compute)
+        if response_format is None:
+            return parsed
+        return response_format.model_validate(parsed)
 
     def _gpt_function_calling_query(self, query, tools):
-        response = self.oai.responses.create(
-            model=self.gpt_model,
-            input=[{"role": "user", "content": query}],
-            tools=tools,
-        )
-        return response
+        def compute():
+            response = self.oai.responses.create(
+                model=self.gpt_model,
+                input=[{"role": "user", "content": query}],
+                tools=tools,
+            )
+            metrics.record_tokens(self.gpt_model, response.usage)
+            return response.model_dump(mode="json")
+
+        return Response.model_validate(self._cached(("tools", query, tools), compute))
 
     def _gpt_query(self, query):
-        response = self.oai.responses.create(
-            model=self.gpt_model,
-            input=query,
-        )
-        return response.output_text
+        def compute():
+            response = self.oai.responses.create(
+                model=self.gpt_model,
+                input=query,
+            )
+            metrics.record_tokens(self.gpt_model, response.usage)
+            if not response.output_text:
+                raise ValueError("The model returned an empty response.")
+            return response.output_text
 
+        return self._cached(("text", query), compute)
+
+    @metrics.timed("notion.sync")
     def _read_paper_db(self, database_id):
-        self.my_db = self.notion.databases.query(
-            **{
-                "database_id": database_id,
-            }
+        self.mirror.sync(full=self.full_sync)
+        self._my_db = {"results": self.mirror.pages()}
+
+    def _index_page(self, page):
+        props = page["properties"]
+        if page["id"] in self._dedup_index or not props["Name"]["title"]:
+            return
+        url = props.get("URL", {}).get("url")
+        arxiv_id = arxiv_id_from_url(url) if url and "arxiv.org/abs/" in url else None
+        self._dedup_index.add(
+            page["id"], props["Name"]["title"][0]["text"]["content"], arxiv_id
         )
 
+    def _remember_page(self, page):
+        self.mirror.upsert(page)
+        if self._dedup_index is not None:
+            self._index_page(page)
+        if self._my_db is not None:
+            results = [p for p in self._my_db["results"] if p["id"] != page["id"]]
+            self._my_db["results"] = [page] + results
+        if self._existing_notion_papers is not None:
+            title = page["properties"]["Name"]["title"]
+            if title:
+                self._existing_notion_papers[title[0]["text"]["content"]] = page["id"]
+
     def _get_paper_by_ratings(self, ratings):
-        all_papers = self.existing_notion_papers
+        buckets = self._get_rating_buckets()
         selected_papers = {}
-        for paper_name, paper_id in all_papers.items():
-            page = self.notion.pages.retrieve(page_id=paper_id)
+        for rating in ratings:
+            selected_papers.update(buckets.get(rating, {}))
+        return selected_papers
+
+    @metrics.timed("notion.ratings")
+    def _get_rating_buckets(self):
+        # one paginated query for rated pages only, grouped by rating;
+        # the query results already carry Rating and Abstract
+        if self._rating_buckets is not None:
+            return self._rating_buckets
+        pages = list(
+            iterate_paginated_api(
+                self.mirror.query,
+                database_id=self.database_id,
+                filter={"property": "Rating", "multi_select": {"is_not_empty": True}},
+            )
+        )
+        self.mirror.upsert(*pages)
+        buckets = {}
+        for page in pages:
+            props = page["properties"]
+            if not props["Name"]["title"] or not props["Rating"]["multi_select"]:
+                continue
+            paper_name = props["Name"]["title"][0]["text"]["content"]
+            rating = int(props["Rating"]["multi_select"][0]["name"])
             abstract = (
-                page["properties"]["Abstract"]["rich_text"][0]["text"]["content"]
-                if page["properties"]["Abstract"]["rich_text"]
+                props["Abstract"]["rich_text"][0]["text"]["content"]
+                if props["Abstract"]["rich_text"]
                 else ""
             )
-            # if rating exists
-            if len(page["properties"]["Rating"]["multi_select"]) > 0:
-                rating = int(page["properties"]["Rating"]["multi_select"][0]["name"])
-                if rating in ratings:
-                    selected_papers[paper_name] = {
-                        "id": paper_id,
-                        "abstract": abstract,
-                        "rating": rating,
-                    }
-        return selected_papers
+            buckets.setdefault(rating, {})[paper_name] = {
+                "id": page["id"],
+                "abstract": abstract,
+                "rating": rating,
+                "edited": page["last_edited_time"],
+            }
+        self._rating_buckets = buckets
+        return buckets
+
+    def _get_rated_abstracts(self, ratings):
+        return [
+            paper["abstract"]
+            for paper in self._get_paper_by_ratings(ratings).values()
+            if paper["abstract"]
+        ]
 
     def _get_all_db_papers(self):
         # parse contents to get a dict of paper names and ids
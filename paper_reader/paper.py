@@ -10,3 +10,22 @@ class Paper(BaseModel):
 
 class ListOfPapers(BaseModel):
     papers: list[Paper]
+
+
+class RankedPaper(BaseModel):
+    arxiv_id: str
+    score: int
+    rationale: str
+
+
+class RankedPapers(BaseModel):
+    papers: list[RankedPaper]
+
+
+class PaperDigest(BaseModel):
+    page_id: str
+    digest: str
+
+
+class PaperDigests(BaseModel):
+    digests: list[PaperDigest]
@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from .instrument import metrics
+from .prefilter import TermCounts
+
+
+def add_papers_overlapped(db, load_preference, past_days=7, **kwargs):
+    """`db.add_papers` with the independent I/O of a daily run overlapped.
+
+    Three threads start together: the arXiv harvest, the Notion mirror sync
+    with the dedup index built from it, and the rated-paper query followed
+    by `load_preference()`, which may regenerate the profile from those
+    ratings. The sequential run does these one after another, and only
+    reads the library once the LLM has ranked. Ranking and the writes start
+    as soon as the harvest and the profile are in, so the run takes about
+    as long as the slowest of the three plus ranking and writing. Returns
+    the papers written, or an empty list if there is no preference.
+    """
+
+    def prepare_preference():
+        # the rating buckets are cached on db and reused by the prefilter
+        db.get_rated_papers()
+        return load_preference()
+
+    with metrics.span("overlap.prepare"), ThreadPoolExecutor(max_workers=3) as pool:
+        harvest = pool.submit(db.harvest, past_days)
+        library = pool.submit(lambda: db.dedup_index)
+        preference = pool.submit(prepare_preference)
+        papers = harvest.result()
+        user_preference = preference.result()
+        library.result()
+
+    if not user_preference:
+        return []
+    return db.add_harvested_papers(
+        user_preference, papers, past_days=past_days, **kwargs
+    )
+
+
+def add_papers_batch(dbs, load_preferences, past_days=7, prefilter_k=150, **kwargs):
+    """`add_papers` for several profiles over one shared arXiv harvest.
+
+    `dbs` holds one manager per profile, all on the same paper store and
+    harvest settings, and `load_preferences` the matching preference loaders.
+    The window is harvested once and its candidates tokenized once for the
+    prefilter, while every profile reads its ratings, loads its preference
+    and syncs its library. Ranking and the Notion writes then run per profile
+    in parallel. Returns the papers written for each profile, an empty list
+    where there is no preference or the profile failed.
+    """
+
+    def prepare(db, load_preference):
+        try:
+            db.get_rated_papers()
+            db.dedup_index
+            return load_preference()
+        except Exception as e:
+            # one broken profile should not stop the others
+            print(f"Skipping the profile for {db.database_id}: {e}")
+
+    def rank(db, user_preference):
+        if not user_preference:
+            return []
+        try:
+            return db.add_harvested_papers(
+                user_preference,
+                papers,
+                past_days=past_days,
+                prefilter_k=prefilter_k,
+                term_counts=term_counts,
+                **kwargs,
+            )
+        except Exception as e:
+            print(f"Ranking failed for {db.database_id}: {e}")
+            return []
+
+    with ThreadPoolExecutor(max_workers=len(dbs) + 1) as pool:
+        with metrics.span("batch.prepare"):
+            preferences = [
+                pool.submit(prepare, db, load)
+                for db, load in zip(dbs, load_preferences)
+            ]
+            papers = dbs[0].harvest(past_days)
+            term_counts = None
+            if prefilter_k and len(papers) > prefilter_k:
+                with metrics.span("prefilter.terms"):
+                    term_counts = TermCounts().add_papers(papers)
+            preferences = [future.result() for future in preferences]
+        with metrics.span("batch.rank"):
+            return list(pool.map(rank, dbs, preferences))
@@ -0,0 +1,134 @@
+import hashlib
+import json
+
+LIKED = (4, 5)
+DISLIKED = (1, 2)
+
+
+def ratings_fingerprint(rated):
+    # the profile only depends on which pages are rated, how, and their content
+    h = hashlib.sha256()
+    for page_id in sorted(rated):
+        paper = rated[page_id]
+        h.update(f"{page_id}\t{paper['rating']}\t{paper['edited']}\n".encode())
+    return h.hexdigest()
+
+
+def _load(history, meta_file):
+    profile = history.latest_preference()
+    try:
+        with open(meta_file) as f:
+            return profile, json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None, None
+
+
+def _save(history, meta_file, profile, meta):
+    history.append_preference(profile)
+    with open(meta_file, "w") as f:
+        json.dump(meta, f)
+
+
+def _label(rating):
+    if rating in LIKED:
+        return "liked"
+    if rating in DISLIKED:
+        return "disliked"
+    return None
+
+
+def refresh_preference(
+    db,
+    prefix,
+    history,
+    meta_file="preference.meta.json",
+    max_incremental=25,
+    force=False,
+):
+    """Bring the preference profile up to date with the Notion ratings.
+
+    A fingerprint of the rated set (page id, rating, last edit) is stored in
+    `meta_file`, and profiles are appended to the `history` store. If the
+    fingerprint is unchanged, the saved profile is returned without any
+    model call. If up to `max_incremental` papers moved between liked,
+    disliked and unrated, the saved profile is updated from short per-paper
+    digests, which are cached in the same file. Otherwise, or with `force`,
+    the profile is rebuilt from full abstracts.
+    """
+    rated = db.get_rated_papers()
+    fingerprint = ratings_fingerprint(rated)
+    prefix_hash = hashlib.sha256(prefix.encode()).hexdigest()
+    profile, meta = _load(history, meta_file)
+
+    rebuild = force or profile is None or meta.get("prefix") != prefix_hash
+    if not rebuild and meta.get("fingerprint") == fingerprint:
+        print("Ratings unchanged, keeping the existing preference profile.")
+        return profile
+
+    previous = {} if rebuild else meta.get("papers", {})
+    digests = {} if rebuild else meta.get("digests", {})
+    changes = {"liked": [], "disliked": [], "unrated": []}
+    for page_id, paper in rated.items():
+        label = _label(paper["rating"])
+        old = previous.get(page_id)
+        if label and (old is None or _label(old["rating"]) != label):
+            changes[label].append(page_id)
+        elif not label and old and _label(old["rating"]):
+            changes["unrated"].append(page_id)
+    for page_id, old in previous.items():
+        if page_id not in rated and _label(old["rating"]):
+            changes["unrated"].append(page_id)
+    n_changes = sum(len(ids) for ids in changes.values())
+
+    if rebuild or n_changes > max_incremental:
+        print("Generating user preference from all rated papers...")
+        profile = db.get_user_preference(prefix)
+        digests = {}
+    elif n_changes:
+        print(f"Updating user preference with {n_changes} changed ratings...")
+        stale = {
+            page_id: rated[page_id]
+            for page_id in changes["liked"] + changes["disliked"]
+            if digests.get(page_id, {}).get("edited") != rated[page_id]["edited"]
+        }
+        for page_id, digest in db.digest_papers(stale).items():
+            if page_id in stale:
+                digests[page_id] = {
+                    "edited": stale[page_id]["edited"],
+                    "digest": digest,
+                }
+
+        def digest_of(page_id):
+            cached = digests.get(page_id)
+            if cached:
+                return cached["digest"]
+            paper = rated.get(page_id) or previous[page_id]
+            return paper["name"]
+
+        profile = db.update_user_preference(
+            prefix,
+            profile,
+            liked=[digest_of(page_id) for page_id in changes["liked"]],
+            disliked=[digest_of(page_id) for page_id in changes["disliked"]],
+            unrated=[digest_of(page_id) for page_id in changes["unrated"]],
+        )
+    else:
+        print("No rating changes affect the preference profile.")
+
+    meta = {
+        "fingerprint": fingerprint,
+        "prefix": prefix_hash,
+        "papers": {
+            page_id: {
+                "name": paper["name"],
+                "rating": paper["rating"],
+                "edited": paper["edited"],
+            }
+            for page_id, paper in rated.items()
+        },
+        "digests": {
+            page_id: digest for page_id, digest in digests.items() if page_id in rated
+        },
+    }
+    _save(history, meta_file, profile, meta)
+    return profile
@@ -0,0 +1,125 @@
+from collections import Counter
+
+import numpy as np
+
+from .table import as_table
+from .tokens import tokenize
+
+
+class TermCounts:
+    """Per-paper term counts over one vocabulary, keyed by arXiv id.
+
+    Each candidate is tokenized once, however many profiles score it. Only
+    `add_papers` grows the shared vocabulary. `count` with an `extra` dict
+    gives terms it has not seen ids in that dict instead, so once the
+    candidates are in, several threads can score against the same instance.
+    """
+
+    def __init__(self):
+        self.vocab = {}
+        self.rows = {}
+
+    def add_papers(self, papers):
+        papers = as_table(papers)
+        for key, title, summary in zip(papers.ids, papers.titles, papers.summaries):
+            if key not in self.rows:
+                self.rows[key] = self.count(f"{title} {title} {summary}")
+        return self
+
+    def count(self, doc, extra=None):
+        # term counts are folded per document into small int32 arrays, so no
+        # python list ever holds one entry per token of the whole batch
+        tf = Counter(tokenize(doc))
+        vocab = self.vocab
+        if extra is None:
+            ids = (vocab.setdefault(t, len(vocab)) for t in tf)
+        else:
+            ids = (
+                vocab[t] if t in vocab else extra.setdefault(t, len(vocab) + len(extra))
+                for t in tf
+            )
+        return (
+            np.fromiter(ids, np.int32, len(tf)),
+            np.fromiter(tf.values(), np.int32, len(tf)),
+        )
+
+
+class TfidfMatrix:
+    """Sublinear TF-IDF over a list of documents, stored as a sparse COO matrix.
+
+    Rows are documents given as `(term ids, counts)` pairs, columns are
+    vocabulary ids. Every row is L2 normalised so that a dot product with a
+    normalised query is a cosine.
+    """
+
+    def __init__(self, docs, n_terms):
+        self.n_docs = len(docs)
+        self.n_terms = max(n_terms, 1)
+        self.rows = np.repeat(np.arange(self.n_docs), [len(c) for c, _ in docs])
+        empty = np.empty(0, np.int32)
+        self.cols = np.concatenate([c for c, _ in docs]) if docs else empty
+        counts = np.concatenate([n for _, n in docs]) if docs else empty
+
+        df = np.bincount(self.cols, minlength=self.n_terms)
+        self.idf = np.log((1 + self.n_docs) / (1 + df)) + 1.0
+        vals = (1.0 + np.log(counts)) * self.idf[self.cols]
+        norms = np.sqrt(np.bincount(self.rows, weights=vals**2, minlength=self.n_docs))
+        self.vals = vals / np.maximum(norms, 1e-12)[self.rows]
+
+    def centroid(self, doc_ids):
+        """Dense, normalised mean of the given rows."""
+        if len(doc_ids) == 0:
+            return np.zeros(self.n_terms)
+        mask = np.isin(self.rows, np.asarray(doc_ids))
+        vec = np.bincount(
+            self.cols[mask], weights=self.vals[mask], minlength=self.n_terms
+        )
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def dot(self, query):
+        return np.bincount(
+            self.rows, weights=self.vals * query[self.cols], minlength=self.n_docs
+        )
+
+
+def prefilter_papers(
+    papers,
+    preference,
+    liked=(),
+    disliked=(),
+    k=150,
+    negative_weight=0.5,
+    term_counts=None,
+):
+    """Keep the `k` papers closest to the user's profile, best first.
+
+    Returns a `PaperTable` view of `papers` (a table or a list of harvest
+    dicts).
+
+    Candidates, the preference text and the rated abstracts share one TF-IDF
+    space. The score is the cosine to the centroid of the preference text and
+    liked abstracts, minus `negative_weight` times the cosine to the centroid
+    of disliked abstracts. A `TermCounts` that already holds the candidates
+    saves tokenizing them again.
+    """
+    papers = as_table(papers)
+    if k is None or len(papers) <= k:
+        return papers
+
+    term_counts = (term_counts or TermCounts()).add_papers(papers)
+    docs = [term_counts.rows[key] for key in papers.ids]
+    n = len(docs)
+    extra = {}
+    for doc in [preference, *liked, *disliked]:
+        docs.append(term_counts.count(doc, extra))
+    matrix = TfidfMatrix(docs, len(term_counts.vocab) + len(extra))
+
+    positive = matrix.centroid(range(n, n + 1 + len(liked)))
+    negative = matrix.centroid(range(n + 1 + len(liked), len(docs)))
+    scores = matrix.dot(positive) - negative_weight * matrix.dot(negative)
+    scores = scores[:n]
+
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind="stable")]
+    return papers.take(top)
@@ -0,0 +1,210 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from .instrument import metrics
+from .prefilter import TermCounts, TfidfMatrix
+
+try:
+    import tiktoken
+except ImportError:  # optional, token counts fall back to an estimate
+    tiktoken = None
+
+# rough size of a token in english text, used without tiktoken
+CHARS_PER_TOKEN = 4
+# longest abstract of a rated example sent to the model
+EXAMPLE_TOKENS = 300
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9])")
+
+
+@lru_cache(maxsize=None)
+def _encoding(model):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text, model):
+    encoding = _encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _head(text, max_tokens, model):
+    # the first max_tokens tokens of text, cut at a word boundary
+    encoding = _encoding(model)
+    if encoding is None:
+        head = text[: max_tokens * CHARS_PER_TOKEN]
+    else:
+        head = encoding.decode(
+            encoding.encode(text, disallowed_special=())[:max_tokens]
+        )
+    return head.rsplit(" ", 1)[0] if " " in head else head
+
+
+def normalize_whitespace(text):
+    return " ".join(text.split())
+
+
+def abbreviate_authors(authors, max_authors=3):
+    """`A, B, C et al.` from a list of names or a `", "`-joined string."""
+    if isinstance(authors, str):
+        authors = [a for a in authors.split(", ") if a]
+    if len(authors) > max_authors:
+        return ", ".join(authors[:max_authors]) + " et al."
+    return ", ".join(authors)
+
+
+def truncate_to_tokens(text, max_tokens, model):
+    """Leading sentences of `text` that fit in `max_tokens`.
+
+    Whitespace is normalised first. Only a first sentence that does not fit
+    on its own is cut mid-sentence. Returns the text and whether it was cut.
+    """
+    text = normalize_whitespace(text)
+    if count_tokens(text, model) <= max_tokens:
+        return text, False
+    if max_tokens < 2:
+        return "", True
+    kept, used = [], 0
+    for sentence in SENTENCE_END.split(text):
+        n = count_tokens(sentence, model) + 1
+        if used + n > max_tokens:
+            break
+        kept.append(sentence)
+        used += n
+    if not kept:
+        return _head(text, max_tokens - 1, model) + " ...", True
+    return " ".join(kept), True
+
+
+def fair_share(sizes, available):
+    """Largest per-item cap with `sum(min(size, cap)) <= available`.
+
+    Short items keep all their tokens and the rest of the budget is split
+    evenly between the long ones.
+    """
+    remaining, n = available, len(sizes)
+    for i, size in enumerate(sorted(sizes)):
+        if size * (n - i) > remaining:
+            return max(remaining // (n - i), 0)
+        remaining -= size
+    return max(sizes, default=0)
+
+
+class PromptPacker:
+    """Greedy packing of prompt lines into a token budget for one model.
+
+    Lines are offered in priority order and kept if they still fit, so a
+    long line that is dropped can leave room for shorter ones after it.
+    `report` prints and records how many lines were packed, truncated on
+    the way in and dropped, and the tokens used.
+    """
+
+    def __init__(self, model, budget):
+        self.model = model
+        self.budget = budget
+        self.lines = []
+        self.used = 0
+        self.truncated = 0
+        self.dropped = 0
+
+    def add(self, line, truncated=False):
+        # +1 for the newline joining the lines
+        n = count_tokens(line, self.model) + 1
+        if self.used + n > self.budget:
+            self.dropped += 1
+            return False
+        self.lines.append(line)
+        self.used += n
+        self.truncated += truncated
+        return True
+
+    def text(self):
+        return "\n".join(self.lines)
+
+    def report(self, label, verbose=True):
+        metrics.count(f"prompt.{label}.packed", len(self.lines))
+        metrics.count(f"prompt.{label}.truncated", self.truncated)
+        metrics.count(f"prompt.{label}.dropped", self.dropped)
+        metrics.count(f"prompt.{label}.tokens", self.used)
+        if verbose:
+            print(
+                f"Packed {len(self.lines)} of {len(self.lines) + self.dropped} "
+                f"{label} papers into {self.used}/{self.budget} tokens "
+                f"({self.truncated} truncated, {self.dropped} dropped)."
+            )
+
+
+def pack_papers(papers, model, budget, max_summary_tokens=None, max_authors=3):
+    """Ranking prompt lines for harvest records, within `budget` tokens.
+
+    Every paper gets `[arxiv id] title by authors: summary`. The summaries
+    share what the headers leave of the budget: short ones are kept whole
+    and long ones are cut to the same number of tokens at a sentence
+    boundary. Papers whose header alone does not fit are dropped. Returns
+    the packer and the ids of the papers that made it in.
+    """
+    heads = [
+        f"[{arxiv_id}] {normalize_whitespace(paper['title'])} by "
+        f"{abbreviate_authors(paper['authors'], max_authors)}:"
+        for arxiv_id, paper in papers.items()
+    ]
+    summaries = [normalize_whitespace(paper["summary"]) for paper in papers.values()]
+    sizes = [count_tokens(summary, model) + 1 for summary in summaries]
+    spare = budget - sum(count_tokens(head, model) + 1 for head in heads)
+    cap = fair_share(sizes, spare)
+    if max_summary_tokens is not None:
+        cap = min(cap, max_summary_tokens)
+
+    packer = PromptPacker(model, budget)
+    packed = []
+    for arxiv_id, head, summary in zip(papers, heads, summaries):
+        summary, cut = truncate_to_tokens(summary, cap - 1, model)
+        if packer.add(f"{head} {summary}".rstrip(), truncated=cut):
+            packed.append(arxiv_id)
+    return packer, packed
+
+
+def select_examples(
+    examples, model, budget, max_example_tokens=EXAMPLE_TOKENS, max_similarity=0.5
+):
+    """Rated papers for a preference prompt, newest first, within `budget`.
+
+    `examples` maps paper names to records with an `abstract` and an
+    `edited` timestamp. Each line is `name: abstract`, with the abstract cut
+    to `max_example_tokens`. Papers whose abstract has a TF-IDF cosine above
+    `max_similarity` to one already picked are held back, and only fill
+    what is left of the budget at the end, so the prompt covers as many
+    topics as it can. Returns the packer.
+    """
+    names = sorted(examples, key=lambda name: examples[name]["edited"], reverse=True)
+    terms = TermCounts()
+    matrix = TfidfMatrix(
+        [terms.count(f"{name} {examples[name]['abstract']}") for name in names],
+        len(terms.vocab),
+    )
+    closest = np.zeros(len(names))
+
+    packer = PromptPacker(model, budget)
+    held_back = []
+    for i, name in enumerate(names):
+        if closest[i] > max_similarity:
+            held_back.append(name)
+            continue
+        abstract, cut = truncate_to_tokens(
+            examples[name]["abstract"], max_example_tokens, model
+        )
+        if packer.add(f"{normalize_whitespace(name)}: {abstract}", truncated=cut):
+            closest = np.maximum(closest, matrix.dot(matrix.centroid([i])))
+    for name in held_back:
+        abstract, cut = truncate_to_tokens(
+            examples[name]["abstract"], max_example_tokens, model
+        )
+        packer.add(f"{normalize_whitespace(name)}: {abstract}", truncated=cut)
+    return packer
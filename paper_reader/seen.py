@@ -0,0 +1,114 @@
+import os
+import re
+import zlib
+from datetime import date
+
+import numpy as np
+
+from .arxiv import arxiv_id_from_url
+from .table import as_table
+
+NEW_STYLE_ID = re.compile(r"^(\d{4})\.(\d{4,5})$")
+EPOCH = date(2000, 1, 1)
+REJECTED, SELECTED = 0, 1
+
+
+def encode_arxiv_id(arxiv_id):
+    # 2401.01234 -> 2401_01234, old style ids (cs/0101001) get a hash with
+    # the top bit set so the two ranges never collide
+    arxiv_id = arxiv_id_from_url(arxiv_id)
+    m = NEW_STYLE_ID.match(arxiv_id)
+    if m:
+        return int(m.group(1)) * 100_000 + int(m.group(2))
+    return (1 << 62) | zlib.crc32(arxiv_id.encode())
+
+
+class SeenSet:
+    """Persistent set of arXiv ids that have already been ranked.
+
+    Ids are packed into a sorted int64 array next to the day each one was
+    evaluated and whether it was selected, about 11 bytes per id, and saved
+    as a compressed .npz. Membership tests are vectorised binary searches.
+    Entries older than `ttl_days` are dropped on load and save.
+    """
+
+    def __init__(self, path="seen_ids.npz", ttl_days=30):
+        self.path = path
+        self.ttl_days = ttl_days
+        self.ids = np.empty(0, dtype=np.int64)
+        self.days = np.empty(0, dtype=np.int16)
+        self.outcomes = np.empty(0, dtype=np.int8)
+        if os.path.exists(path):
+            with np.load(path) as data:
+                self.ids = data["ids"]
+                self.days = data["days"]
+                self.outcomes = data["outcomes"]
+        self._expire()
+
+    @staticmethod
+    def _today():
+        return (date.today() - EPOCH).days
+
+    def _expire(self):
+        keep = self.days >= self._today() - self.ttl_days
+        self.ids, self.days, self.outcomes = (
+            self.ids[keep],
+            self.days[keep],
+            self.outcomes[keep],
+        )
+
+    def _positions(self, keys):
+        pos = np.searchsorted(self.ids, keys)
+        found = pos < len(self.ids)
+        found[found] = self.ids[pos[found]] == keys[found]
+        return pos, found
+
+    def contains(self, arxiv_ids):
+        keys = np.fromiter(
+            (encode_arxiv_id(i) for i in arxiv_ids),
+            dtype=np.int64,
+            count=len(arxiv_ids),
+        )
+        return self._positions(keys)[1]
+
+    def filter_new(self, papers):
+        papers = as_table(papers)
+        if not len(self.ids):
+            return papers
+        return papers[~self.contains(papers.ids)]
+
+    def outcome(self, arxiv_id):
+        pos, found = self._positions(np.array([encode_arxiv_id(arxiv_id)]))
+        return int(self.outcomes[pos[0]]) if found[0] else None
+
+    def add(self, arxiv_ids, selected_ids=()):
+        selected = {encode_arxiv_id(i) for i in selected_ids}
+        keys = np.array(sorted({encode_arxiv_id(i) for i in arxiv_ids}), dtype=np.int64)
+        outcomes = np.array(
+            [SELECTED if k in selected else REJECTED for k in keys], dtype=np.int8
+        )
+        days = np.full(len(keys), self._today(), dtype=np.int16)
+
+        # re-evaluated ids replace their old entry
+        _, found = self._positions(keys)
+        if found.any():
+            keep = ~np.isin(self.ids, keys[found])
+            self.ids, self.days, self.outcomes = (
+                self.ids[keep],
+                self.days[keep],
+                self.outcomes[keep],
+            )
+        ids = np.concatenate([self.ids, keys])
+        order = np.argsort(ids, kind="stable")
+        self.ids = ids[order]
+        self.days = np.concatenate([self.days, days])[order]
+        self.outcomes = np.concatenate([self.outcomes, outcomes])[order]
+
+    def save(self):
+        self._expire()
+        tmp = self.path + ".tmp.npz"
+        np.savez_compressed(tmp, ids=self.ids, days=self.days, outcomes=self.outcomes)
+        os.replace(tmp, self.path)
+
+    def __len__(self):
+        return len(self.ids)
@@ -0,0 +1,180 @@
+import json
+import sqlite3
+from datetime import datetime, timedelta
+
+from .arxiv import ARXIV_CATEGORIES, arxiv_id_from_url, iter_recent_arxiv_papers
+from .table import PaperTable
+
+# arXiv announces papers hours after submission, so a paper can show up in the
+# API with a submittedDate older than the newest one we already hold. Each
+# sync re-reads this much history before the watermark to pick those up.
+SYNC_OVERLAP = timedelta(days=2)
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+class ArxivStore:
+    """Local SQLite copy of harvested arXiv metadata, keyed by arXiv id.
+
+    `sync` only asks the API for entries newer than the stored watermark (the
+    latest `published` timestamp of the last completed sync), and `window`
+    serves the candidate set for a ranking run as a `PaperTable`. Both take
+    the harvested categories: each category set keeps its own watermark, so
+    a new set starts with a full window, and `window` only returns papers
+    listed in one of them. A set also records since when its papers are
+    complete; a window reaching further back is read in full.
+
+    Each sync prunes papers published more than `keep_days` days ago, or
+    longer if its own window is.
+    """
+
+    def __init__(self, path="arxiv.db", keep_days=30):
+        self.path = path
+        self.keep_days = keep_days
+        # the overlapped pipeline harvests on a worker thread
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS papers (
+                arxiv_id TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                title TEXT NOT NULL,
+                authors TEXT NOT NULL,
+                categories TEXT NOT NULL,
+                published TEXT NOT NULL,
+                summary TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS papers_published ON papers (published);
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+            """)
+
+    def close(self):
+        self.conn.close()
+
+    # --- watermark ---
+    @staticmethod
+    def _meta_key(name, categories):
+        return f"{name}:" + ",".join(sorted(set(categories)))
+
+    def _get_time(self, key):
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return datetime.strptime(row[0], TIME_FORMAT) if row else None
+
+    def get_watermark(self, categories=ARXIV_CATEGORIES):
+        return self._get_time(self._meta_key("watermark", categories))
+
+    def get_synced_since(self, categories=ARXIV_CATEGORIES):
+        return self._get_time(self._meta_key("synced_since", categories))
+
+    def _record_sync(self, newest, since, categories):
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value "
+            "WHERE excluded.value > meta.value",
+            (self._meta_key("watermark", categories), newest),
+        )
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value "
+            "WHERE excluded.value < meta.value",
+            (self._meta_key("synced_since", categories), since.strftime(TIME_FORMAT)),
+        )
+
+    # --- read / write ---
+    def upsert(self, papers):
+        rows = [
+            (
+                arxiv_id_from_url(p["id"]),
+                p["id"],
+                p["title"],
+                json.dumps(p["authors"]),
+                json.dumps(p.get("categories", [])),
+                p["published"],
+                p["summary"],
+            )
+            for p in papers
+        ]
+        if not rows:
+            return 0
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO papers VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+        return len(rows)
+
+    def sync(
+        self, days_ago=7, batch_size=200, categories=ARXIV_CATEGORIES, **harvest_kwargs
+    ):
+        """Fetch entries newer than the watermark, bounded by the `days_ago` window."""
+        window_start = datetime.utcnow() - timedelta(days=days_ago)
+        watermark = self.get_watermark(categories)
+        synced_since = self.get_synced_since(categories)
+        since = window_start
+        # incremental only if the store already holds the start of the window
+        if watermark is not None and synced_since is not None:
+            if synced_since <= window_start:
+                since = max(window_start, watermark - SYNC_OVERLAP)
+
+        # the harvest runs newest first, so the watermark only moves once the
+        # whole window is in; a failed sync is re-read from the old one
+        added, batch, newest = 0, [], None
+        for paper in iter_recent_arxiv_papers(
+            days_ago=days_ago, since=since, categories=categories, **harvest_kwargs
+        ):
+            batch.append(paper)
+            newest = max(newest or paper["published"], paper["published"])
+            if len(batch) >= batch_size:
+                added += self.upsert(batch)
+                batch = []
+        added += self.upsert(batch)
+        if newest is not None:
+            with self.conn:
+                self._record_sync(newest, since, categories)
+        print(f"Synced {added} arxiv entries newer than {since:%Y-%m-%d %H:%M}.")
+        self.prune(max(days_ago, self.keep_days))
+        return added
+
+    def prune(self, days_ago):
+        """Delete papers published more than `days_ago` days ago."""
+        before = (datetime.utcnow() - timedelta(days=days_ago)).strftime(TIME_FORMAT)
+        with self.conn:
+            deleted = self.conn.execute(
+                "DELETE FROM papers WHERE published < ?", (before,)
+            ).rowcount
+            # no category set is complete before the pruned horizon any more
+            self.conn.execute(
+                "UPDATE meta SET value = ? "
+                "WHERE key LIKE 'synced_since:%' AND value < ?",
+                (before, before),
+            )
+        return deleted
+
+    def window(self, days_ago=7, categories=ARXIV_CATEGORIES):
+        cutoff = (datetime.utcnow() - timedelta(days=days_ago)).strftime(TIME_FORMAT)
+        categories = sorted(set(categories))
+        # papers synced for other categories share the table
+        rows = self.conn.execute(
+            "SELECT url, title, authors, categories, published, summary "
+            "FROM papers WHERE published >= ? AND EXISTS ("
+            "SELECT 1 FROM json_each(papers.categories) "
+            f"WHERE value IN ({', '.join('?' * len(categories))})"
+            ") ORDER BY published DESC",
+            (cutoff, *categories),
+        )
+        return PaperTable.from_records(
+            {
+                "title": title,
+                "authors": json.loads(authors),
+                "published": published,
+                "id": url,
+                "summary": summary,
+                "categories": json.loads(categories),
+            }
+            for url, title, authors, categories, published, summary in rows
+        )
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
@@ -0,0 +1,150 @@
+import numpy as np
+
+from .arxiv import arxiv_id_from_url
+from .paper import Paper
+
+TEXT_COLUMNS = ("id", "title", "summary", "published")
+
+
+def _object_array(values):
+    # np.array would copy strings into a fixed-width unicode block
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+class _Interner:
+    def __init__(self):
+        self.index = {}
+        self.codes = []
+        self.bounds = []
+
+    def add_row(self, values):
+        if isinstance(values, str):
+            # Paper.authors is already joined with ", "
+            values = [v for v in values.split(", ") if v]
+        start = len(self.codes)
+        self.codes.extend(self.index.setdefault(v, len(self.index)) for v in values)
+        self.bounds.append((start, len(self.codes)))
+
+    def freeze(self):
+        codes = np.array(self.codes, dtype=np.int32)
+        bounds = np.array(self.bounds, dtype=np.int64).reshape(-1, 2)
+        return (codes, _object_array(list(self.index))), bounds[:, 0], bounds[:, 1]
+
+
+class PaperTable:
+    """Columnar batch of papers passed between the pipeline stages.
+
+    Ids, titles, summaries and publish dates are numpy object arrays holding
+    references to the original strings. Authors and categories are interned
+    into pools of unique strings; each row points at a `[start, end)` run of
+    codes into them. Indexing with a slice, a boolean mask or an index array
+    returns a new table whose columns are numpy views or gathers, while the
+    strings, codes and pools stay shared, so narrowing a batch stage by stage
+    never copies text. A single row (from `table[i]` or iteration) is the same
+    dict that `get_recent_arxiv_papers` yields.
+    """
+
+    def __init__(self, columns, authors, categories):
+        self.columns = columns
+        # (codes, pool) pairs shared with every table derived from this one
+        self.authors = authors
+        self.categories = categories
+
+    @classmethod
+    def from_records(cls, records):
+        """Build a table from an iterable of harvest dicts, consumed lazily."""
+        text = {name: [] for name in TEXT_COLUMNS}
+        authors, categories = _Interner(), _Interner()
+        for record in records:
+            for name in TEXT_COLUMNS:
+                text[name].append(record.get(name, ""))
+            authors.add_row(record["authors"])
+            categories.add_row(record.get("categories", ()))
+
+        columns = {name: _object_array(values) for name, values in text.items()}
+        interned = {}
+        for kind, interner in (("author", authors), ("category", categories)):
+            interned[kind], columns[f"{kind}_start"], columns[f"{kind}_end"] = (
+                interner.freeze()
+            )
+        return cls(columns, interned["author"], interned["category"])
+
+    @classmethod
+    def from_papers(cls, papers):
+        return cls.from_records(
+            {
+                "id": f"http://arxiv.org/abs/{paper.arxiv_id}",
+                "title": paper.name,
+                "summary": paper.summary,
+                "authors": paper.authors,
+            }
+            for paper in papers
+        )
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return self.record(key)
+        return PaperTable(
+            {name: column[key] for name, column in self.columns.items()},
+            self.authors,
+            self.categories,
+        )
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.record(i)
+
+    def take(self, indices):
+        return self[np.asarray(indices, dtype=np.int64)]
+
+    @property
+    def ids(self):
+        return self.columns["id"]
+
+    @property
+    def titles(self):
+        return self.columns["title"]
+
+    @property
+    def summaries(self):
+        return self.columns["summary"]
+
+    def _run(self, interned, kind, i):
+        codes, pool = interned
+        start = self.columns[f"{kind}_start"][i]
+        end = self.columns[f"{kind}_end"][i]
+        return pool[codes[start:end]].tolist()
+
+    def record(self, i):
+        c = self.columns
+        return {
+            "title": c["title"][i],
+            "authors": self._run(self.authors, "author", i),
+            "published": c["published"][i],
+            "id": c["id"][i],
+            "summary": c["summary"][i],
+            "categories": self._run(self.categories, "category", i),
+        }
+
+    def paper(self, i):
+        return Paper(
+            name=" ".join(self.titles[i].split()),
+            arxiv_id=arxiv_id_from_url(self.ids[i]),
+            summary=" ".join(self.summaries[i].split()),
+            authors=", ".join(self._run(self.authors, "author", i)),
+        )
+
+    def to_papers(self):
+        return [self.paper(i) for i in range(len(self))]
+
+
+def as_table(papers):
+    """`papers` as a PaperTable, converting a list of harvest dicts if needed."""
+    if isinstance(papers, PaperTable):
+        return papers
+    return PaperTable.from_records(papers)
@@ -0,0 +1,14 @@
+import re
+
+# shared by the ranking prefilter and the static site's search index, so it
+# stays free of third-party imports
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset("""
+    a an and are as at be by can for from has have in into is it its of on or
+    our that the their these this to we which with via using based show paper
+    propose proposed approach method methods results new also than such both
+    """.split())
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
@@ -0,0 +1,94 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import httpx
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
+
+from .ratelimit import TokenBucket
+
+# Notion allows an average of three requests per second per integration
+NOTION_RATE = 3.0
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class NotionWriter:
+    """Runs Notion write calls concurrently under the API rate limit.
+
+    Each job is a `(key, fn, kwargs)` tuple, e.g.
+    `(title, notion.pages.update, {"page_id": ..., "properties": ...})`.
+    Every attempt takes a token from a shared bucket. Rate-limited and
+    transient failures are retried with jittered exponential backoff, and a
+    429's `Retry-After` header is honoured. Jobs run with `idempotent=False`,
+    such as page creates, are only retried on a 429: after a timeout or a
+    5xx the page may already exist. `run` returns one report dict per job,
+    in input order. Reads share the same budget through `call`.
+    """
+
+    def __init__(
+        self,
+        rate=NOTION_RATE,
+        max_workers=3,
+        max_retries=5,
+        base_wait=1.0,
+    ):
+        self.bucket = TokenBucket(rate)
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.base_wait = base_wait
+
+    def run(self, jobs, idempotent=True):
+        jobs = list(jobs)
+        if not jobs:
+            return []
+        run_one = partial(self._run_one, idempotent=idempotent)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            return list(pool.map(run_one, jobs))
+
+    def call(self, fn, **kwargs):
+        """One call under the shared rate limit and retry policy, e.g. a read."""
+        return self._call(fn, kwargs)[0]
+
+    def _call(self, fn, kwargs, idempotent=True):
+        for attempt in range(1, self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                return fn(**kwargs), attempt
+            except (HTTPResponseError, RequestTimeoutError, httpx.TransportError) as e:
+                status = getattr(e, "status", None)
+                retryable = status is None or status in RETRYABLE_STATUS
+                if not idempotent:
+                    # a rejected request is the only one known not to have run
+                    retryable = status == 429
+                if not retryable or attempt == self.max_retries:
+                    e.attempts = attempt
+                    raise
+                wait = self.base_wait * 2 ** (attempt - 1) * (0.5 + random.random())
+                if status == 429:
+                    retry_after = e.headers.get("retry-after")
+                    if retry_after:
+                        wait = max(wait, float(retry_after))
+                    self.bucket.pause(wait)
+                time.sleep(wait)
+
+    def _run_one(self, job, idempotent=True):
+        key, fn, kwargs = job
+        try:
+            result, attempts = self._call(fn, kwargs, idempotent)
+        except (HTTPResponseError, RequestTimeoutError, httpx.TransportError) as e:
+            return {
+                "key": key,
+                "ok": False,
+                "error": str(e),
+                "status": getattr(e, "status", None),
+                "attempts": e.attempts,
+            }
+        return {"key": key, "ok": True, "result": result, "attempts": attempts}
+
+    @staticmethod
+    def summarize(reports):
+        failed = [r for r in reports if not r["ok"]]
+        for r in failed:
+            print(f"Notion write failed for {r['key']}: {r['error']}")
+        return len(reports) - len(failed), len(failed)
@@ -0,0 +1,53 @@
+import unittest
+from unittest import mock
+
+from paper_reader import ratelimit
+from paper_reader.ratelimit import TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TokenBucketTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch.object(ratelimit, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rate_below_one_banks_a_whole_token(self):
+        bucket = TokenBucket(1 / 3)
+        self.assertEqual(bucket.capacity, 1)
+        bucket.acquire()
+        self.assertEqual(self.clock.now, 0)
+        bucket.acquire()
+        self.assertAlmostEqual(self.clock.now, 3)
+
+    def test_capacity_defaults_to_rate(self):
+        bucket = TokenBucket(3)
+        for _ in range(3):
+            bucket.acquire()
+        self.assertEqual(self.clock.sleeps, [])
+        bucket.acquire()
+        self.assertAlmostEqual(self.clock.now, 1 / 3)
+
+    def test_pause_delays_the_next_token(self):
+        bucket = TokenBucket(2, capacity=1)
+        bucket.acquire()
+        bucket.pause(5)
+        bucket.acquire()
+        self.assertAlmostEqual(self.clock.now, 5.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
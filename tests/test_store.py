@@ -0,0 +1,66 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+from paper_reader import store
+from paper_reader.store import TIME_FORMAT, ArxivStore
+
+
+def paper(i, days_ago, categories=("cs.LG",)):
+    published = datetime.utcnow() - timedelta(days=days_ago)
+    return {
+        "id": f"http://arxiv.org/abs/2401.{i:05d}v1",
+        "title": f"Paper {i}",
+        "authors": ["A. Author"],
+        "categories": list(categories),
+        "published": published.strftime(TIME_FORMAT),
+        "summary": "An abstract.",
+    }
+
+
+class ArxivStoreTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.store = ArxivStore(os.path.join(tmp.name, "arxiv.db"), keep_days=10)
+        self.addCleanup(self.store.close)
+        self.calls = []
+
+    def harvest(self, papers):
+        def fake(days_ago, since, categories, **kwargs):
+            self.calls.append(since)
+            return [p for p in papers if p["published"] >= since.strftime(TIME_FORMAT)]
+
+        return mock.patch.object(store, "iter_recent_arxiv_papers", fake)
+
+    def test_sync_prunes_papers_past_keep_days(self):
+        papers = [paper(i, days_ago=i + 0.5) for i in range(20)]
+        self.store.upsert(papers)
+        with self.harvest(papers):
+            self.store.sync(days_ago=7)
+        self.assertEqual(len(self.store), 10)
+        self.assertEqual(len(self.store.window(days_ago=7)), 7)
+
+    def test_longer_window_prunes_less_and_is_read_in_full(self):
+        papers = [paper(i, days_ago=i + 0.5) for i in range(20)]
+        with self.harvest(papers):
+            self.store.sync(days_ago=5)
+            self.store.sync(days_ago=15)
+        # the store only held 5 days, so the 15 day window is not incremental
+        self.assertLess(self.calls[1], datetime.utcnow() - timedelta(days=14))
+        self.assertEqual(len(self.store.window(days_ago=15)), 15)
+
+    def test_window_past_the_pruned_horizon_is_read_in_full(self):
+        papers = [paper(i, days_ago=i + 0.5) for i in range(40)]
+        with self.harvest(papers):
+            self.store.sync(days_ago=30)
+            self.store.prune(days_ago=7)
+            self.store.sync(days_ago=20)
+        self.assertLess(self.calls[1], datetime.utcnow() - timedelta(days=19))
+        self.assertEqual(len(self.store.window(days_ago=20)), 20)
+
+
+if __name__ == "__main__":
+    unittest.main()